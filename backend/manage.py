@@ -0,0 +1,121 @@
+import asyncio
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+import orjson
+import typer
+from fastapi.encoders import jsonable_encoder
+from passlib.hash import bcrypt as bcrypt_hash
+from pydantic import TypeAdapter
+
+from server import (
+    PaymentEntryResponse,
+    client,
+    rebuild_reminder_counters,
+    rebuild_rollups,
+    reindex_search,
+    serialize_payment_entry,
+)
+
+cli = typer.Typer(help="Commandes de maintenance PayTrack")
+
+def run(coroutine):
+    try:
+        return asyncio.run(coroutine)
+    finally:
+        client.close()
+
+@cli.command("rebuild-rollups")
+def rebuild_rollups_command():
+    """Recompute the analytics rollup collection from the payment entries"""
+    groups = run(rebuild_rollups())
+    typer.echo(f"Rollups recalculés : {groups} groupes")
+
+@cli.command("rebuild-reminder-counters")
+def rebuild_reminder_counters_command():
+    """Recompute reminder_count and last_reminder_at on payment entries from the reminders"""
+    updated = run(rebuild_reminder_counters())
+    typer.echo(f"Compteurs de relances mis à jour : {updated} entrées")
+
+@cli.command("reindex-search")
+def reindex_search_command():
+    """Recompute the search fields of every payment entry (after an upgrade or a direct database edit)"""
+    updated = run(reindex_search())
+    typer.echo(f"Index de recherche mis à jour : {updated} entrées")
+
+@cli.command("calibrate-bcrypt")
+def calibrate_bcrypt_command(
+    target_ms: float = typer.Option(250, help="Temps de vérification visé, en millisecondes"),
+    min_rounds: int = typer.Option(10, help="Coût minimal accepté"),
+    max_rounds: int = typer.Option(16, help="Coût maximal testé"),
+    samples: int = typer.Option(3, help="Mesures par coût")
+):
+    """Benchmark bcrypt on this host and suggest the BCRYPT_ROUNDS value closest to the target latency"""
+    chosen = min_rounds
+    for rounds in range(min_rounds, max_rounds + 1):
+        hashed = bcrypt_hash.using(rounds=rounds).hash("calibration")
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            bcrypt_hash.verify("calibration", hashed)
+            timings.append((time.perf_counter() - started) * 1000)
+        median_ms = statistics.median(timings)
+        typer.echo(f"rounds={rounds}: {median_ms:.1f} ms")
+        if median_ms > target_ms:
+            break
+        chosen = rounds
+    typer.echo(f"BCRYPT_ROUNDS={chosen}")
+
+@cli.command("bench-serialization")
+def bench_serialization_command(
+    entries: int = typer.Option(1000, help="Nombre d'entrées par liste"),
+    rounds: int = typer.Option(20, help="Nombre de répétitions")
+):
+    """Compare per-entry cost of the Pydantic response path with the direct orjson path"""
+    now = datetime.utcnow()
+    documents = [
+        {
+            "id": str(uuid.uuid4()),
+            "company_id": str(uuid.uuid4()),
+            "company_name": "Entreprise",
+            "client_name": f"Client {i}",
+            "invoice_number": f"F-{i:06d}",
+            "amount": 1234.5 + i,
+            "created_by": str(uuid.uuid4()),
+            "created_by_name": "Employé",
+            "created_at": now - timedelta(minutes=i),
+            "is_validated": i % 2 == 0,
+            "validated_at": now if i % 2 == 0 else None,
+            "validated_by": str(uuid.uuid4()) if i % 2 == 0 else None,
+            "validated_by_name": "Manager" if i % 2 == 0 else None,
+            "reminder_count": i % 3,
+            "last_reminder_at": None
+        }
+        for i in range(entries)
+    ]
+    adapter = TypeAdapter(List[PaymentEntryResponse])
+    
+    def pydantic_path():
+        # Model per entry, then what FastAPI does with response_model: dump, validate, encode, json.dumps
+        models = [PaymentEntryResponse(**document) for document in documents]
+        validated = adapter.validate_python([model.model_dump() for model in models])
+        return json.dumps(jsonable_encoder(validated)).encode()
+    
+    def orjson_path():
+        return orjson.dumps([serialize_payment_entry(document) for document in documents])
+    
+    for name, path in (("pydantic + response_model", pydantic_path), ("orjson direct", orjson_path)):
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            path()
+            timings.append(time.perf_counter() - started)
+        per_entry_us = statistics.median(timings) / entries * 1_000_000
+        typer.echo(f"{name}: {per_entry_us:.2f} µs par entrée")
+
+if __name__ == "__main__":
+    cli()
@@ -1,20 +1,45 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Request, Response, BackgroundTasks, UploadFile, File, status
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import jwt
+import orjson
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+import xlsxwriter
 from passlib.context import CryptContext
 import bcrypt
 import random
 import string
+import base64
+import hashlib
+import json
+import csv
+import io
+import itertools
+import re
+import tempfile
+import time
+import unicodedata
+import asyncio
+import bisect
+import heapq
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -24,6 +49,42 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Indexes every query path relies on, per collection; ensured at startup by ensure_indexes()
+REQUIRED_INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "companies": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+    ],
+    "payment_entries": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Also serves plain is_validated filters through its prefix
+        IndexModel([("is_validated", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="is_validated_created_at"),
+        # Filtered lists (one company's or one employee's pending entries), newest first
+        IndexModel([("company_id", ASCENDING), ("is_validated", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="company_id_is_validated_created_at"),
+        IndexModel([("created_by", ASCENDING), ("is_validated", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="created_by_is_validated_created_at"),
+        # sort=validated_at / sort=last_reminder_at (pending entries by least recently chased) / sort=amount
+        IndexModel([("is_validated", ASCENDING), ("validated_at", DESCENDING), ("id", DESCENDING)], name="is_validated_validated_at"),
+        # Validated tab filtered on one company, latest validations first
+        IndexModel([("company_id", ASCENDING), ("is_validated", ASCENDING), ("validated_at", DESCENDING), ("id", DESCENDING)], name="company_id_is_validated_validated_at"),
+        IndexModel([("is_validated", ASCENDING), ("last_reminder_at", ASCENDING), ("id", ASCENDING)], name="is_validated_last_reminder_at_id"),
+        IndexModel([("amount", ASCENDING), ("id", ASCENDING)], name="amount_id"),
+        # Read-back of the entries one bulk validation stamped
+        IndexModel([("validation_batch", ASCENDING)], name="validation_batch", sparse=True),
+        # Keyset pagination order of GET /payment-entries
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        # GET /payment-entries/search (multikey: normalized client_name and invoice_number)
+        IndexModel([("search_grams", ASCENDING)], name="search_grams"),
+        IndexModel([("search_keys", ASCENDING)], name="search_keys"),
+    ],
+    "reminders": [
+        # History of one entry, most recent first (keyset pagination)
+        IndexModel([("payment_entry_id", ASCENDING), ("triggered_at", DESCENDING), ("id", DESCENDING)], name="payment_entry_id_triggered_at"),
+    ],
+}
+
 # Create the main app
 app = FastAPI()
 
@@ -32,11 +93,107 @@ api_router = APIRouter(prefix="/api")
 
 # Security
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Work factor chosen with `python manage.py calibrate-bcrypt`; hashes with any other cost are
+# flagged by needs_update() and rehashed after the next successful login
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 SECRET_KEY = "paytrack-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480
 
+# Stateless mode: trust role/identifiant claims in the token, only checking its version
+AUTH_STATELESS = os.environ.get('AUTH_STATELESS', 'false').lower() == 'true'
+TOKEN_VERSION_REFRESH_SECONDS = float(os.environ.get('TOKEN_VERSION_REFRESH_SECONDS', 30))
+
+# Company/user name directories (per process)
+NAME_DIRECTORY_SIZE = int(os.environ.get('NAME_DIRECTORY_SIZE', 10000))
+NAME_DIRECTORY_REFRESH_SECONDS = float(os.environ.get('NAME_DIRECTORY_REFRESH_SECONDS', 300))
+
+# Client name autocomplete (per process): full reload interval, distinct names ranked per keystroke
+CLIENT_NAME_REFRESH_SECONDS = float(os.environ.get('CLIENT_NAME_REFRESH_SECONDS', 300))
+CLIENT_NAME_MAX_SCAN = 5000
+AUTOCOMPLETE_DEFAULT_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Password hashing pool: bcrypt releases the GIL, so hashes run in parallel off the event loop
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+
+# Authenticated user cache (per process)
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', 60))
+
+# Pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500
+
+# Conditional GET: browsers keep the response but revalidate it with If-None-Match on every use
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+# Bulk import
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REPORTED_ERRORS = 1000
+# Characters one JSON item may span: an unterminated string must not make the parser buffer the whole upload
+IMPORT_MAX_ITEM_SIZE = 1024 * 1024
+
+# Ledger export (GET /payment-entries/export); an Excel sheet holds at most 1,048,576 rows, header included
+EXPORT_COLUMNS = [
+    "id", "company_id", "company_name", "client_name", "invoice_number", "amount",
+    "created_by", "created_by_name", "created_at", "is_validated",
+    "validated_at", "validated_by", "validated_by_name", "reminder_count", "last_reminder_at"
+]
+XLSX_MAX_ROWS = 1048576
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Columnar exports for analytics (GET /exports/...): typed schemas, timestamps in UTC
+EXPORT_TIMESTAMP = pa.timestamp("us", tz="UTC")
+PAYMENT_ENTRY_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("company_id", pa.string()),
+    ("company_name", pa.string()),
+    ("client_name", pa.string()),
+    ("invoice_number", pa.string()),
+    ("amount", pa.float64()),
+    ("created_by", pa.string()),
+    ("created_by_name", pa.string()),
+    ("created_at", EXPORT_TIMESTAMP),
+    ("is_validated", pa.bool_()),
+    ("validated_at", EXPORT_TIMESTAMP),
+    ("validated_by", pa.string()),
+    ("validated_by_name", pa.string()),
+    ("reminder_count", pa.int32()),
+    ("last_reminder_at", EXPORT_TIMESTAMP)
+])
+REMINDER_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("payment_entry_id", pa.string()),
+    ("triggered_by", pa.string()),
+    ("triggered_by_name", pa.string()),
+    ("triggered_at", EXPORT_TIMESTAMP),
+    ("note", pa.string())
+])
+COLUMNAR_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file"
+}
+
+# Search over client_name/invoice_number: trigram index for substrings, shorter terms match as prefixes.
+# Broad terms are ranked among the first SEARCH_MAX_CANDIDATES matches only.
+SEARCH_GRAM_SIZE = 3
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_CANDIDATES = 10000
+
+# Random user_id draws before giving up; collisions are detected by the users.user_id unique index
+USER_ID_MAX_ATTEMPTS = 10
+
 def generate_user_id():
     """Generate a random 6-character user ID"""
     return ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
@@ -72,6 +229,13 @@ class UserUpdate(BaseModel):
     password: Optional[str] = None
     role: Optional[str] = None
 
+class CurrentUser(BaseModel):
+    id: str
+    user_id: str
+    identifiant: str
+    role: str
+    created_at: datetime
+
 class UserLogin(BaseModel):
     user_id: str
     password: str
@@ -94,6 +258,8 @@ class PaymentEntry(BaseModel):
     is_validated: bool = False
     validated_at: Optional[datetime] = None
     validated_by: Optional[str] = None
+    reminder_count: int = 0
+    last_reminder_at: Optional[datetime] = None
 
 class PaymentEntryCreate(BaseModel):
     company_id: str
@@ -115,6 +281,8 @@ class PaymentEntryResponse(BaseModel):
     validated_at: Optional[datetime]
     validated_by: Optional[str]
     validated_by_name: Optional[str]
+    reminder_count: int = 0
+    last_reminder_at: Optional[datetime] = None
 
 class Reminder(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -135,6 +303,38 @@ class ReminderResponse(BaseModel):
     triggered_at: datetime
     note: Optional[str]
 
+class ImportRowError(BaseModel):
+    row: int
+    error: str
+
+class ImportReport(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[ImportRowError]
+
+class BulkValidateRequest(BaseModel):
+    ids: Optional[List[str]] = None
+    company_id: Optional[str] = None
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+class BulkValidateReport(BaseModel):
+    validated: List[str]
+    already_validated: List[str]
+    missing: List[str]
+    # Requested ids of pending entries outside the company/date filters
+    out_of_scope: List[str] = []
+
+class ReminderBatchRequest(BaseModel):
+    payment_entry_ids: List[str] = Field(..., max_length=MAX_PAGE_SIZE)
+    limit: int = Field(20, ge=1, le=MAX_PAGE_SIZE)
+
+class ReminderHistory(BaseModel):
+    payment_entry_id: str
+    reminders: List[ReminderResponse]
+    next_cursor: Optional[str] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -159,11 +359,577 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class PasswordHashPool:
+    """Thread pool running bcrypt work with at most `workers` hashes at once, recording queue and run times"""
+    
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self.pending = 0
+        self.completed = 0
+        self.queue_seconds_total = 0.0
+        self.queue_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+    
+    async def run(self, func, *args):
+        submitted = time.monotonic()
+        
+        def job():
+            started = time.monotonic()
+            result = func(*args)
+            return result, started - submitted, time.monotonic() - started
+        
+        self.pending += 1
+        try:
+            result, queued, ran = await asyncio.get_running_loop().run_in_executor(self.executor, job)
+        finally:
+            self.pending -= 1
+        
+        self.completed += 1
+        self.queue_seconds_total += queued
+        self.queue_seconds_max = max(self.queue_seconds_max, queued)
+        self.run_seconds_total += ran
+        return result
+    
+    def stats(self) -> dict:
+        completed = self.completed or 1
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "completed": self.completed,
+            "avg_queue_ms": round(self.queue_seconds_total / completed * 1000, 2),
+            "max_queue_ms": round(self.queue_seconds_max * 1000, 2),
+            "avg_run_ms": round(self.run_seconds_total / completed * 1000, 2)
+        }
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_WORKERS)
+
+async def verify_password(plain_password, hashed_password):
+    return await password_hash_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+async def get_password_hash(password):
+    return await password_hash_pool.run(pwd_context.hash, password)
+
+async def rehash_password(user_id: str, old_hash: str, password: str):
+    """Upgrade a hash to the configured cost, unless the password changed in the meantime"""
+    new_hash = await get_password_hash(password)
+    await db.users.update_one(
+        {"id": user_id, "password_hash": old_hash},
+        {"$set": {"password_hash": new_hash}}
+    )
+
+# Projections: reads only transfer the fields they use (never _id, never password_hash unless verifying)
+USER_PROJECTION = {"_id": 0, "id": 1, "user_id": 1, "identifiant": 1, "name": 1, "role": 1, "created_at": 1}
+USER_LOGIN_PROJECTION = {**USER_PROJECTION, "password_hash": 1}
+COMPANY_PROJECTION = {"_id": 0, "id": 1, "name": 1, "created_at": 1}
+EXISTS_PROJECTION = {"_id": 1}
+
+# Stored payment entry fields returned by list endpoints; names are attached from the name directories
+PAYMENT_ENTRY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "company_id": 1,
+    "client_name": 1,
+    "invoice_number": 1,
+    "amount": 1,
+    "created_by": 1,
+    "created_at": 1,
+    "is_validated": 1,
+    "validated_at": 1,
+    "validated_by": 1,
+    "reminder_count": 1,
+    "last_reminder_at": 1
+}
+
+def encode_cursor(value, document_id: str, sort: str) -> str:
+    """Opaque keyset cursor pointing just after the (value, id) position in the given sort order"""
+    encoded = {"d": value.isoformat()} if isinstance(value, datetime) else {"n": value}
+    raw = json.dumps({"s": sort, "v": encoded, "id": document_id})
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str, sort: str) -> dict:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        # A cursor is only meaningful for the sort order it was issued for
+        if data["s"] != sort:
+            raise ValueError(data["s"])
+        value = datetime.fromisoformat(data["v"]["d"]) if "d" in data["v"] else data["v"]["n"]
+        return {"value": value, "id": str(data["id"])}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+# Mongo orders values of different types by type bracket: null/missing < numbers < strings < dates.
+# Range operators never cross brackets, so the brackets past the cursor's are matched by type.
+_CURSOR_BRACKET_TYPES = (None, "number", "string", "date")
+
+def cursor_bracket(value) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 2
+    return 1
+
+def bracket_match(field: str, bracket: int) -> dict:
+    # {field: None} also matches a missing field, which sorts as null
+    return {field: None} if bracket == 0 else {field: {"$type": _CURSOR_BRACKET_TYPES[bracket]}}
+
+def keyset_after(cursor: dict, field: str, descending: bool = True) -> dict:
+    """Match documents strictly after the cursor in (field, id) order.
+    
+    Legacy string dates sort between numbers and dates, null/missing values before everything
+    in ascending order (so last in descending order).
+    """
+    value, document_id = cursor["value"], cursor["id"]
+    bracket = cursor_bracket(value)
+    branches = [{field: value, "id": {"$lt": document_id} if descending else {"$gt": document_id}}]
+    if bracket:
+        branches.insert(0, {field: {"$lt" if descending else "$gt": value}})
+    later = range(bracket - 1, -1, -1) if descending else range(bracket + 1, len(_CURSOR_BRACKET_TYPES))
+    branches.extend(bracket_match(field, later_bracket) for later_bracket in later)
+    return {"$or": branches} if len(branches) > 1 else branches[0]
+
+# Response fields selectable with ?fields=, and the stored fields each one needs
+PAYMENT_ENTRY_FIELDS = list(PaymentEntryResponse.model_fields)
+PAYMENT_ENTRY_FIELD_SOURCES = {
+    "company_name": "company_id",
+    "created_by_name": "created_by",
+    "validated_by_name": "validated_by"
+}
+
+def parse_entry_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Validate a comma-separated ?fields= list; id is always returned"""
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in PAYMENT_ENTRY_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Champ inconnu : {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", *requested]))
+
+def entry_projection(fields: Optional[List[str]], sort_field: str) -> dict:
+    if fields is None:
+        return PAYMENT_ENTRY_PROJECTION
+    # The sort field and id are always read: they make up the pagination cursor
+    projection = {"_id": 0, "id": 1, sort_field: 1}
+    for field in fields:
+        source = PAYMENT_ENTRY_FIELD_SOURCES.get(field, field)
+        projection[source] = 1
+    return projection
+
+def normalize_search_text(value: str) -> str:
+    """Lowercase, accent-free, single-spaced form used for search matching"""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.lower().split())
+
+def search_grams(text: str) -> set:
+    return {text[i:i + SEARCH_GRAM_SIZE] for i in range(len(text) - SEARCH_GRAM_SIZE + 1)}
+
+def search_fields(entry: dict) -> dict:
+    """Stored search index of a payment entry; recomputed whenever client_name or invoice_number is written"""
+    keys = [normalize_search_text(entry["client_name"]), normalize_search_text(entry["invoice_number"])]
+    grams = set()
+    for key in keys:
+        grams |= search_grams(key)
+    return {"search_keys": keys, "search_grams": sorted(grams)}
+
+# Sort orders accepted by GET /payment-entries ("-" for descending); id breaks ties in the same direction
+PAYMENT_ENTRY_SORT_PATTERN = "^-?(created_at|validated_at|amount|last_reminder_at)$"
+
+def payment_entry_filters(
+    validated_only: bool = False,
+    is_validated: Optional[bool] = None,
+    company_id: Optional[str] = None,
+    created_by: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    validated_from: Optional[datetime] = None,
+    validated_to: Optional[datetime] = None,
+    amount_min: Optional[float] = None,
+    amount_max: Optional[float] = None
+) -> dict:
+    """Mongo query for the payment entry list filters (shared by every endpoint listing entries)"""
+    query = {}
+    if is_validated is not None:
+        query["is_validated"] = is_validated
+    elif validated_only:
+        query["is_validated"] = True
+    if company_id:
+        query["company_id"] = company_id
+    if created_by:
+        query["created_by"] = created_by
+    
+    for field, lower, upper in (
+        ("created_at", created_from, created_to),
+        ("validated_at", validated_from, validated_to),
+        ("amount", amount_min, amount_max)
+    ):
+        bounds = {}
+        if lower is not None:
+            bounds["$gte"] = lower
+        if upper is not None:
+            bounds["$lte"] = upper
+        if bounds:
+            query[field] = bounds
+    return query
+
+# Reminder histories are listed most recent first
+REMINDER_SORT = "-triggered_at"
+REMINDER_PROJECTION = {"_id": 0, "id": 1, "payment_entry_id": 1, "triggered_by": 1, "triggered_at": 1, "note": 1}
+
+# List endpoints serialize projected documents straight to JSON with orjson: the dicts below have
+# exactly the response_model shape, so the per-item Pydantic construction and FastAPI's second
+# validation pass are skipped (see `python manage.py bench-serialization`)
+def serialize_reminder(reminder: dict) -> dict:
+    return {
+        "id": reminder["id"],
+        "payment_entry_id": reminder["payment_entry_id"],
+        "triggered_by": reminder["triggered_by"],
+        "triggered_by_name": reminder.get("triggered_by_name"),
+        "triggered_at": reminder["triggered_at"],
+        "note": reminder.get("note")
+    }
+
+def serialize_payment_entry(entry: dict) -> dict:
+    return {
+        "id": entry["id"],
+        "company_id": entry["company_id"],
+        "company_name": entry.get("company_name"),
+        "client_name": entry["client_name"],
+        "invoice_number": entry["invoice_number"],
+        "amount": entry["amount"],
+        "created_by": entry["created_by"],
+        "created_by_name": entry.get("created_by_name"),
+        "created_at": entry["created_at"],
+        "is_validated": entry["is_validated"],
+        "validated_at": entry.get("validated_at"),
+        "validated_by": entry.get("validated_by"),
+        "validated_by_name": entry.get("validated_by_name"),
+        "reminder_count": entry.get("reminder_count", 0),
+        "last_reminder_at": entry.get("last_reminder_at")
+    }
+
+def serialize_sparse_payment_entry(entry: dict, fields: List[str]) -> dict:
+    return {field: entry.get(field, 0 if field == "reminder_count" else None) for field in fields}
+
+def serialize_user(user: dict) -> dict:
+    return {
+        "id": user["id"],
+        "user_id": user["user_id"],
+        # Handle migration for old users without identifiant field
+        "identifiant": user.get("identifiant", user.get("name", user.get("user_id", "Unknown"))),
+        "role": user["role"],
+        "created_at": user["created_at"]
+    }
+
+def fast_json(content, response: Optional[Response] = None) -> ORJSONResponse:
+    """orjson response carrying the headers already set on the endpoint's Response parameter"""
+    return ORJSONResponse(content, headers=dict(response.headers) if response is not None else None)
+
+# Tasks started without being awaited (startup backfills, cache refreshes); referenced until done
+detached_tasks = set()
+
+def spawn(coroutine, description: str):
+    def done(task: asyncio.Task):
+        detached_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("%s failed", description, exc_info=task.exception())
+    
+    task = asyncio.create_task(coroutine)
+    detached_tasks.add(task)
+    task.add_done_callback(done)
+    return task
+
+class UserCache:
+    """Bounded LRU cache of users keyed by id, each entry expiring after a TTL"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+    
+    def get(self, user_id: str) -> Optional[CurrentUser]:
+        item = self._entries.get(user_id)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return item[1]
+    
+    def set(self, user_id: str, user: CurrentUser):
+        self._entries[user_id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def invalidate(self, user_id: str):
+        self._entries.pop(user_id, None)
+    
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL_SECONDS)
+
+class TokenVersionTable:
+    """In-memory mirror of the token_versions collection, reloaded at most every refresh interval.
+    
+    Tokens carry the version current at login; bumping it revokes every older token of that user.
+    """
+    
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+    
+    async def get(self, user_id: str) -> int:
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                    await self.reload()
+        return self._versions.get(user_id, 0)
+    
+    async def reload(self):
+        docs = await db.token_versions.find({}, {"version": 1}).to_list(None)
+        self._versions = {doc["_id"]: doc["version"] for doc in docs}
+        self._loaded_at = time.monotonic()
+    
+    async def current(self, user_id: str) -> int:
+        """Authoritative version, read from the database (used when issuing tokens)"""
+        doc = await db.token_versions.find_one({"_id": user_id}, {"version": 1})
+        version = doc["version"] if doc else 0
+        self._versions[user_id] = version
+        return version
+    
+    async def revoke(self, user_id: str) -> int:
+        doc = await db.token_versions.find_one_and_update(
+            {"_id": user_id},
+            {"$inc": {"version": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self._versions[user_id] = doc["version"]
+        return doc["version"]
+
+token_versions = TokenVersionTable(TOKEN_VERSION_REFRESH_SECONDS)
+
+class NameDirectory:
+    """Process-level id -> display name map for one collection.
+    
+    Loaded lazily, fully reloaded every refresh interval, bounded to maxsize ids (least recently used
+    evicted); ids not in memory are fetched in one batched query. Writers update it through put().
+    Writes from other processes are picked up through sync(), fed the collection version the ETags use.
+    """
+    
+    def __init__(self, collection_name: str, projection: dict, name_of, maxsize: int, refresh_seconds: float):
+        self.collection_name = collection_name
+        self.projection = projection
+        self.name_of = name_of
+        self.maxsize = maxsize
+        self.refresh_seconds = refresh_seconds
+        self.hits = 0
+        self.misses = 0
+        self._names = OrderedDict()
+        self._loaded_at = None
+        self._version = None
+        self._lock = asyncio.Lock()
+    
+    def _store(self, document_id: str, name: Optional[str]):
+        self._names[document_id] = name
+        self._names.move_to_end(document_id)
+        while len(self._names) > self.maxsize:
+            self._names.popitem(last=False)
+    
+    async def _reload(self):
+        documents = await db[self.collection_name].find({}, self.projection).limit(self.maxsize).to_list(None)
+        self._names = OrderedDict((document["id"], self.name_of(document)) for document in documents)
+        self._loaded_at = time.monotonic()
+    
+    async def resolve(self, ids) -> dict:
+        """Names for the given ids; unknown ids map to None"""
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            async with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+                    await self._reload()
+        
+        names, missing = {}, []
+        for document_id in set(ids):
+            if document_id in self._names:
+                self._names.move_to_end(document_id)
+                names[document_id] = self._names[document_id]
+                self.hits += 1
+            else:
+                missing.append(document_id)
+                self.misses += 1
+        
+        if missing:
+            documents = await db[self.collection_name].find({"id": {"$in": missing}}, self.projection).to_list(None)
+            found = {document["id"]: self.name_of(document) for document in documents}
+            for document_id in missing:
+                # Unknown ids are remembered too, until the next refresh
+                names[document_id] = found.get(document_id)
+                self._store(document_id, names[document_id])
+        return names
+    
+    def put(self, document_id: str, name: str):
+        self._store(document_id, name)
+    
+    def sync(self, version: int):
+        """Reload on the next resolve if the collection changed since the version last seen"""
+        if version != self._version:
+            self._loaded_at = None
+            self._version = version
+    
+    def stats(self) -> dict:
+        return {"size": len(self._names), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+def user_display_name(user_doc: dict) -> str:
+    # Handle migration for old users without identifiant field
+    return user_doc.get("identifiant", user_doc.get("name", user_doc.get("user_id", "Utilisateur inconnu")))
+
+company_names = NameDirectory(
+    "companies", {"_id": 0, "id": 1, "name": 1}, lambda company: company["name"],
+    NAME_DIRECTORY_SIZE, NAME_DIRECTORY_REFRESH_SECONDS
+)
+user_names = NameDirectory(
+    "users", {"_id": 0, "id": 1, "identifiant": 1, "name": 1, "user_id": 1}, user_display_name,
+    NAME_DIRECTORY_SIZE, NAME_DIRECTORY_REFRESH_SECONDS
+)
+
+class ClientNameIndex:
+    """Process-level autocomplete index of distinct client names, for all companies and per company.
+    
+    Names are grouped by their normalized form (the most used spelling is suggested) and kept in sorted
+    lists, so a prefix lookup is two bisects and a scan of at most max_scan names. Loaded lazily with one
+    $group; once expired, the current snapshot keeps being served while a background task reloads it
+    (picking up other processes' writes). This process' writes adjust it in place through record().
+    """
+    
+    def __init__(self, refresh_seconds: float, max_scan: int):
+        self.refresh_seconds = refresh_seconds
+        self.max_scan = max_scan
+        # company_id (None: all companies) -> (sorted normalized names, {normalized name: {spelling: count}})
+        self._scopes = {}
+        self._loaded_at = None
+        self._refresh = None
+        self._lock = asyncio.Lock()
+    
+    async def _background_reload(self):
+        try:
+            await self._reload()
+        finally:
+            self._refresh = None
+    
+    async def _reload(self):
+        groups = await db.payment_entries.aggregate([
+            {"$group": {"_id": {"company_id": "$company_id", "client_name": "$client_name"}, "count": {"$sum": 1}}}
+        ]).to_list(None)
+        scopes = {}
+        for group in groups:
+            client_name = group["_id"]["client_name"]
+            key = normalize_search_text(client_name)
+            for scope in (None, group["_id"]["company_id"]):
+                spellings = scopes.setdefault(scope, {}).setdefault(key, {})
+                spellings[client_name] = spellings.get(client_name, 0) + group["count"]
+        # Sorted once here; record() keeps the lists sorted with insort
+        self._scopes = {scope: (sorted(names), names) for scope, names in scopes.items()}
+        self._loaded_at = time.monotonic()
+    
+    def _adjust(self, scope: Optional[str], client_name: str, delta: int):
+        keys, names = self._scopes.setdefault(scope, ([], {}))
+        key = normalize_search_text(client_name)
+        if key not in names:
+            if delta <= 0:
+                return
+            names[key] = {}
+            bisect.insort(keys, key)
+        spellings = names[key]
+        spellings[client_name] = spellings.get(client_name, 0) + delta
+        if spellings[client_name] <= 0:
+            del spellings[client_name]
+        if not spellings:
+            del names[key]
+            del keys[bisect.bisect_left(keys, key)]
+    
+    def record(self, company_id: str, client_name: str, delta: int = 1):
+        """Count (or with a negative delta, uncount) entries written by this process"""
+        # Before the first load there is nothing to adjust: the load reads the database
+        if self._loaded_at is None:
+            return
+        for scope in (None, company_id):
+            self._adjust(scope, client_name, delta)
+    
+    async def suggest(self, prefix: str, company_id: Optional[str] = None, limit: int = AUTOCOMPLETE_DEFAULT_LIMIT) -> List[str]:
+        """Most used client names starting with prefix (accents and case ignored)"""
+        # Only the very first lookup waits for the $group; later reloads never block a keystroke
+        if self._loaded_at is None:
+            async with self._lock:
+                if self._loaded_at is None:
+                    await self._reload()
+        elif time.monotonic() - self._loaded_at > self.refresh_seconds and self._refresh is None:
+            self._refresh = spawn(self._background_reload(), "Client name index refresh")
+        
+        keys, names = self._scopes.get(company_id, ([], {}))
+        prefix = normalize_search_text(prefix)
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + chr(0x10FFFF), start)
+        candidates = keys[start:min(end, start + self.max_scan)]
+        
+        top = heapq.nlargest(limit, candidates, key=lambda key: sum(names[key].values()))
+        return [max(names[key].items(), key=lambda item: item[1])[0] for key in top]
+    
+    def stats(self) -> dict:
+        return {"scopes": len(self._scopes), "names": len(self._scopes.get(None, ([], {}))[0])}
+
+client_names = ClientNameIndex(CLIENT_NAME_REFRESH_SECONDS, CLIENT_NAME_MAX_SCAN)
+
+async def attach_entry_names(entries: List[dict]) -> List[dict]:
+    """Set company_name, created_by_name and validated_by_name on payment entry documents"""
+    # Sparse reads (?fields=) may leave some of the id fields out; only the projected ones are resolved
+    companies = await company_names.resolve(entry["company_id"] for entry in entries if "company_id" in entry)
+    users = await user_names.resolve(
+        [entry["created_by"] for entry in entries if "created_by" in entry]
+        + [entry["validated_by"] for entry in entries if entry.get("validated_by")]
+    )
+    for entry in entries:
+        if "company_id" in entry:
+            entry["company_name"] = companies.get(entry["company_id"]) or "Entreprise inconnue"
+        if "created_by" in entry:
+            entry["created_by_name"] = users.get(entry["created_by"]) or "Utilisateur inconnu"
+        entry["validated_by_name"] = users.get(entry["validated_by"]) if entry.get("validated_by") else None
+    return entries
+
+async def attach_reminder_names(reminders: List[dict]) -> List[dict]:
+    users = await user_names.resolve(reminder["triggered_by"] for reminder in reminders)
+    for reminder in reminders:
+        reminder["triggered_by_name"] = users.get(reminder["triggered_by"]) or "Utilisateur inconnu"
+    return reminders
+
+def current_user_from_doc(user_doc: dict) -> CurrentUser:
+    return CurrentUser(
+        id=user_doc["id"],
+        user_id=user_doc["user_id"],
+        identifiant=user_doc.get("identifiant", user_doc.get("name", user_doc["user_id"])),
+        role=user_doc["role"],
+        created_at=user_doc["created_at"]
+    )
+
+def token_claims(user: User, version: int) -> dict:
+    return {
+        "sub": user.id,
+        "user_id": user.user_id,
+        "identifiant": user.identifiant,
+        "role": user.role,
+        "created_at": user.created_at.isoformat(),
+        "ver": version
+    }
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
@@ -174,19 +940,369 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Token invalide")
     
-    user_doc = await db.users.find_one({"id": user_id})
+    # Stateless mode: authorization comes from the claims, revocation from the version table.
+    # Tokens issued before claims were added still go through the lookup below.
+    if AUTH_STATELESS and "role" in payload:
+        if payload.get("ver", 0) < await token_versions.get(user_id):
+            raise HTTPException(status_code=401, detail="Token révoqué")
+        try:
+            return CurrentUser(
+                id=user_id,
+                user_id=payload["user_id"],
+                identifiant=payload["identifiant"],
+                role=payload["role"],
+                created_at=payload["created_at"]
+            )
+        except (KeyError, ValueError):
+            raise HTTPException(status_code=401, detail="Token invalide")
+    
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+    
+    user_doc = await db.users.find_one({"id": user_id}, USER_PROJECTION)
     if user_doc is None:
         raise HTTPException(status_code=401, detail="Utilisateur non trouvé")
     
-    return User(**user_doc)
+    user = current_user_from_doc(user_doc)
+    user_cache.set(user_id, user)
+    return user
+
+# Streaming parsers for bulk imports
+_JSON_WHITESPACE = re.compile(r"\s*")
+_JSON_NUMBER_DELIMITERS = frozenset(" \t\r\n,]")
+
+def iter_json_array(stream, chunk_size: int = 65536, max_item_size: int = IMPORT_MAX_ITEM_SIZE):
+    """Yield the items of a top-level JSON array, reading the stream chunk by chunk.
+    
+    Raises ValueError on anything that is not exactly one array: missing or extra commas, missing
+    brackets, invalid items, items longer than max_item_size, or content after the closing bracket.
+    """
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    buffer, pos, eof, need_more = "", 0, False, False
+    # What the array grammar allows next: "open" ("["), "first" (an item or "]"),
+    # "separator" ("," or "]"), "item" (an item, after a comma), "end" (nothing but whitespace)
+    expected = "open"
+    while True:
+        if not eof and (need_more or len(buffer) - pos < chunk_size):
+            chunk = reader.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos, need_more = 0, False
+        
+        pos = _JSON_WHITESPACE.match(buffer, pos).end()
+        if pos == len(buffer):
+            if not eof:
+                need_more = True
+                continue
+            if expected == "end":
+                return
+            raise ValueError("Fichier JSON vide" if expected == "open" else "Tableau JSON incomplet")
+        
+        char = buffer[pos]
+        if expected == "open":
+            if char != "[":
+                raise ValueError("Un tableau JSON est attendu")
+            pos += 1
+            expected = "first"
+            continue
+        if expected == "end":
+            raise ValueError("Contenu inattendu après le tableau JSON")
+        if char == "]":
+            if expected == "item":
+                raise ValueError("Virgule en trop dans le tableau JSON")
+            pos += 1
+            expected = "end"
+            continue
+        if expected == "separator":
+            if char != ",":
+                raise ValueError("Virgule attendue entre les éléments du tableau JSON")
+            pos += 1
+            expected = "item"
+            continue
+        if char == ",":
+            raise ValueError("Virgule en trop dans le tableau JSON")
+        
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise ValueError("JSON invalide")
+            # Each retry decodes the item from its start: bounding the item bounds the work
+            if len(buffer) - pos > max_item_size:
+                raise ValueError("Élément JSON trop volumineux")
+            need_more = True
+            continue
+        # A number cut by the buffer boundary ("12" of "1234.5") decodes fine: only a delimiter proves it complete
+        is_number = isinstance(item, (int, float)) and not isinstance(item, bool)
+        if is_number and not eof and (end == len(buffer) or buffer[end] not in _JSON_NUMBER_DELIMITERS):
+            if len(buffer) - pos > max_item_size:
+                raise ValueError("Élément JSON trop volumineux")
+            need_more = True
+            continue
+        pos = end
+        expected = "separator"
+        yield item
+
+def iter_csv_rows(stream):
+    """Yield CSV rows as dicts; the delimiter (comma, semicolon or tab) is detected from the header"""
+    reader = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    header = reader.readline()
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    fieldnames = [name.strip() for name in next(csv.reader([header], dialect))]
+    yield from csv.DictReader(reader, fieldnames=fieldnames, dialect=dialect)
+
+def validation_error_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in exc.errors()
+    )
+
+# Collection versions
+# Every write bumps the version of the collections it touches; list ETags are derived from them,
+# so a conditional GET can be answered without running the list query
+async def bump_versions(*collection_names: str):
+    await db.collection_versions.bulk_write(
+        [UpdateOne({"_id": name}, {"$inc": {"version": 1}}, upsert=True) for name in collection_names],
+        ordered=False
+    )
+
+async def compute_etag(collection_names: List[str], *scope) -> str:
+    documents = await db.collection_versions.find({"_id": {"$in": collection_names}}, {"version": 1}).to_list(None)
+    versions = {document["_id"]: document["version"] for document in documents}
+    # Names in the body come from the directories: they must not be older than the versions in the ETag
+    for directory in (company_names, user_names):
+        if directory.collection_name in collection_names:
+            directory.sync(versions.get(directory.collection_name, 0))
+    raw = json.dumps([[versions.get(name, 0) for name in collection_names], *scope], default=str)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+async def not_modified(request: Request, response: Response, collection_names: List[str], *scope) -> Optional[Response]:
+    """Return a 304 response if the client's copy is current, otherwise set the ETag on the response"""
+    etag = await compute_etag(collection_names, request.url.path, request.url.query, *scope)
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
+    return None
+
+# Analytics rollups
+# Pre-aggregated counters per dimension, kept current with $inc on every payment entry write
+ROLLUP_DIMENSIONS = ("total", "company", "employee", "month")
+ROLLUP_FIELDS = ("count", "amount", "validated", "validated_amount")
+
+# Per-group counters accumulated by every rollup $group stage
+ROLLUP_GROUP_FIELDS = {
+    "count": {"$sum": 1},
+    "amount": {"$sum": "$amount"},
+    "validated": {"$sum": {"$cond": ["$is_validated", 1, 0]}},
+    "validated_amount": {"$sum": {"$cond": ["$is_validated", "$amount", 0]}}
+}
+
+# created_at as "YYYY-MM"; legacy string dates are converted, unparseable ones fall back to "Date inconnue"
+MONTH_KEY_EXPR = {
+    "$dateToString": {
+        "format": "%Y-%m",
+        "date": {"$convert": {"input": "$created_at", "to": "date", "onError": None, "onNull": None}},
+        "onNull": "Date inconnue"
+    }
+}
+
+# Recomputes every rollup group from the ledger in one pass
+ROLLUP_PIPELINE = [
+    {"$facet": {
+        "total": [{"$group": {"_id": None, **ROLLUP_GROUP_FIELDS}}],
+        "company": [{"$group": {"_id": "$company_id", **ROLLUP_GROUP_FIELDS}}],
+        "employee": [{"$group": {"_id": "$created_by", **ROLLUP_GROUP_FIELDS}}],
+        "month": [{"$group": {"_id": MONTH_KEY_EXPR, **ROLLUP_GROUP_FIELDS}}]
+    }}
+]
+
+ROLLUP_READ_PROJECTION = {"_id": 0, "dimension": 1, "key": 1, **dict.fromkeys(ROLLUP_FIELDS, 1)}
+
+# Written by rebuild_rollups() together with the groups: until it exists the collection is not a
+# complete picture of the ledger, so incremental updates are skipped and analytics aggregate live
+ROLLUPS_BUILT_ID = "meta:built"
+
+# Fields rollup_keys()/add_rollup_delta() need from an entry
+ROLLUP_PROJECTION = {"_id": 0, "company_id": 1, "created_by": 1, "created_at": 1, "amount": 1}
+
+# Read back from entries being edited or deleted: rollup fields plus the client name index
+ENTRY_CHANGE_PROJECTION = {**ROLLUP_PROJECTION, "client_name": 1}
+
+def coerce_datetime(value) -> Optional[datetime]:
+    """Stored date as a naive UTC datetime, like the BSON dates; legacy ISO strings are parsed
+    (offsets converted to UTC, as Mongo's $convert does), anything unparseable gives None"""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+    return None
+
+def month_key(created_at) -> str:
+    """Python counterpart of MONTH_KEY_EXPR"""
+    created_at = coerce_datetime(created_at)
+    return created_at.strftime("%Y-%m") if created_at else "Date inconnue"
+
+def rollup_id(dimension: str, key: Optional[str]) -> str:
+    return dimension if key is None else f"{dimension}:{key}"
+
+def rollup_keys(entry: dict) -> List[tuple]:
+    return [
+        ("total", None),
+        ("company", entry["company_id"]),
+        ("employee", entry["created_by"]),
+        ("month", month_key(entry["created_at"]))
+    ]
+
+def add_rollup_delta(deltas: dict, entry: dict, count: int = 0, validated: int = 0) -> dict:
+    """Accumulate the counter changes caused by adding/removing (count) or validating (validated) an entry"""
+    for dimension_key in rollup_keys(entry):
+        delta = deltas.setdefault(dimension_key, dict.fromkeys(ROLLUP_FIELDS, 0))
+        delta["count"] += count
+        delta["amount"] += count * entry["amount"]
+        delta["validated"] += validated
+        delta["validated_amount"] += validated * entry["amount"]
+    return deltas
+
+class RollupState:
+    """Whether the rollup collection has been built; once seen built, it stays built for the process"""
+    
+    def __init__(self):
+        self.built = False
+    
+    async def ready(self) -> bool:
+        if not self.built:
+            sentinel = await db.analytics_rollups.find_one({"_id": ROLLUPS_BUILT_ID}, EXISTS_PROJECTION)
+            self.built = sentinel is not None
+        return self.built
+
+rollup_state = RollupState()
+
+async def apply_rollup_deltas(deltas: dict):
+    # Before the first rebuild, $inc would upsert partial groups counting only post-deploy writes
+    if not await rollup_state.ready():
+        return
+    operations = [
+        UpdateOne(
+            {"_id": rollup_id(dimension, key)},
+            {"$inc": delta, "$setOnInsert": {"dimension": dimension, "key": key}},
+            upsert=True
+        )
+        for (dimension, key), delta in deltas.items()
+        if any(delta.values())
+    ]
+    if operations:
+        await db.analytics_rollups.bulk_write(operations, ordered=False)
+
+async def compute_rollups() -> List[dict]:
+    """Rollup documents aggregated from the payment entries with ROLLUP_PIPELINE"""
+    result = (await db.payment_entries.aggregate(ROLLUP_PIPELINE).to_list(1))[0]
+    return [
+        {
+            "_id": rollup_id(dimension, group["_id"]),
+            "dimension": dimension,
+            "key": group["_id"],
+            **{field: group[field] for field in ROLLUP_FIELDS}
+        }
+        for dimension in ROLLUP_DIMENSIONS
+        for group in result[dimension]
+    ]
+
+async def rebuild_rollups() -> int:
+    """Recompute the rollup collection from scratch and atomically swap it in. Returns the number of groups."""
+    documents = await compute_rollups()
+    
+    # Writes landing between the aggregation and the rename are lost; run during quiet periods.
+    # One staging collection per run, so that concurrent rebuilds (workers starting together) do not interfere.
+    staging = db[f"analytics_rollups_rebuild_{uuid.uuid4().hex}"]
+    await staging.insert_many(documents + [{"_id": ROLLUPS_BUILT_ID, "dimension": "meta", "key": None}])
+    await staging.rename("analytics_rollups", dropTarget=True)
+    rollup_state.built = True
+    await bump_versions("analytics_rollups")
+    return len(documents)
+
+async def ensure_rollups():
+    if not await rollup_state.ready():
+        logger.warning("Analytics rollups not built, rebuilding them from the payment entries")
+        groups = await rebuild_rollups()
+        logger.info("Analytics rollups rebuilt: %d groups", groups)
+
+async def rebuild_reminder_counters() -> int:
+    """Recompute reminder_count/last_reminder_at from the reminders collection. Returns the number of entries updated."""
+    counters = await db.reminders.aggregate([
+        {"$group": {"_id": "$payment_entry_id", "count": {"$sum": 1}, "last": {"$max": "$triggered_at"}}}
+    ]).to_list(None)
+    
+    operations = [
+        UpdateOne({"id": counter["_id"]}, {"$set": {"reminder_count": counter["count"], "last_reminder_at": counter["last"]}})
+        for counter in counters
+    ]
+    # Entries whose reminders are all gone
+    operations.append(UpdateMany(
+        {"reminder_count": {"$gt": 0}, "id": {"$nin": [counter["_id"] for counter in counters]}},
+        {"$set": {"reminder_count": 0, "last_reminder_at": None}}
+    ))
+    # Entries from before the counters existed, without reminders (those with reminders are set above)
+    operations.append(UpdateMany(
+        {"reminder_count": {"$exists": False}, "id": {"$nin": [counter["_id"] for counter in counters]}},
+        {"$set": {"reminder_count": 0, "last_reminder_at": None}}
+    ))
+    result = await db.payment_entries.bulk_write(operations, ordered=False)
+    await bump_versions("payment_entries")
+    return result.modified_count
+
+async def reindex_search(missing_only: bool = False) -> int:
+    """Recompute the stored search fields of every payment entry (or only of those without any).
+    Returns the number of entries updated."""
+    updated = 0
+    operations = []
+    query = {"search_grams": {"$exists": False}} if missing_only else {}
+    cursor = db.payment_entries.find(query, {"_id": 0, "id": 1, "client_name": 1, "invoice_number": 1})
+    async for entry in cursor.batch_size(IMPORT_BATCH_SIZE):
+        operations.append(UpdateOne({"id": entry["id"]}, {"$set": search_fields(entry)}))
+        if len(operations) >= IMPORT_BATCH_SIZE:
+            updated += (await db.payment_entries.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await db.payment_entries.bulk_write(operations, ordered=False)).modified_count
+    return updated
+
+async def backfill_reminder_counters():
+    """Count the reminders of entries written before reminder_count existed, so badges and sort=last_reminder_at are right"""
+    if await db.payment_entries.find_one({"reminder_count": {"$exists": False}}, EXISTS_PROJECTION) is None:
+        return
+    logger.warning("Payment entries without reminder counters, rebuilding them from the reminders")
+    updated = await rebuild_reminder_counters()
+    logger.info("Reminder counters rebuilt on %d payment entries", updated)
+
+async def backfill_search_fields():
+    """Index entries written before search existed (or directly in the database), so search covers the whole ledger"""
+    if await db.payment_entries.find_one({"search_grams": {"$exists": False}}, EXISTS_PROJECTION) is None:
+        return
+    logger.warning("Payment entries without search fields, backfilling them")
+    updated = await reindex_search(missing_only=True)
+    logger.info("Search fields backfilled on %d payment entries", updated)
 
 # Routes
 @api_router.post("/login", response_model=Token)
-async def login(user_login: UserLogin):
-    user_doc = await db.users.find_one({"user_id": user_login.user_id})
-    if not user_doc or not verify_password(user_login.password, user_doc["password_hash"]):
+async def login(user_login: UserLogin, background_tasks: BackgroundTasks):
+    user_doc = await db.users.find_one({"user_id": user_login.user_id}, USER_LOGIN_PROJECTION)
+    if not user_doc or not await verify_password(user_login.password, user_doc["password_hash"]):
         raise HTTPException(status_code=401, detail="Identifiants invalides")
     
+    # Migrate hashes made with another work factor once the response is sent
+    if pwd_context.needs_update(user_doc["password_hash"]):
+        background_tasks.add_task(rehash_password, user_doc["id"], user_doc["password_hash"], user_login.password)
+    
     # Handle migration for old users without identifiant field
     if "identifiant" not in user_doc:
         user_doc["identifiant"] = user_doc.get("name", user_doc["user_id"])
@@ -194,9 +1310,12 @@ async def login(user_login: UserLogin):
             {"user_id": user_login.user_id},
             {"$set": {"identifiant": user_doc["identifiant"]}}
         )
+        user_cache.invalidate(user_doc["id"])
+        user_names.put(user_doc["id"], user_doc["identifiant"])
+        await bump_versions("users")
     
     user = User(**user_doc)
-    access_token = create_access_token(data={"sub": user.id})
+    access_token = create_access_token(data=token_claims(user, await token_versions.current(user.id)))
     
     user_response = UserResponse(
         id=user.id,
@@ -209,7 +1328,7 @@ async def login(user_login: UserLogin):
     return Token(access_token=access_token, token_type="bearer", user=user_response)
 
 @api_router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: CurrentUser = Depends(get_current_user)):
     return UserResponse(
         id=current_user.id,
         user_id=current_user.user_id,
@@ -220,58 +1339,76 @@ async def get_me(current_user: User = Depends(get_current_user)):
 
 # Company routes
 @api_router.post("/companies", response_model=Company)
-async def create_company(company: CompanyCreate, current_user: User = Depends(get_current_user)):
+async def create_company(company: CompanyCreate, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Seuls les admins et managers peuvent créer des entreprises")
     
     company_obj = Company(name=company.name)
     await db.companies.insert_one(company_obj.dict())
+    company_names.put(company_obj.id, company_obj.name)
+    await bump_versions("companies")
     return company_obj
 
 @api_router.get("/companies", response_model=List[Company])
-async def get_companies(current_user: User = Depends(get_current_user)):
-    companies = await db.companies.find().to_list(1000)
-    return [Company(**company) for company in companies]
+async def get_companies(request: Request, response: Response, current_user: CurrentUser = Depends(get_current_user)):
+    cached = await not_modified(request, response, ["companies"])
+    if cached:
+        return cached
+    
+    companies = await db.companies.find({}, COMPANY_PROJECTION).to_list(1000)
+    return fast_json(companies, response)
 
 @api_router.put("/companies/{company_id}", response_model=Company)
-async def update_company(company_id: str, company_update: CompanyUpdate, current_user: User = Depends(get_current_user)):
+async def update_company(company_id: str, company_update: CompanyUpdate, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Seuls les admins et managers peuvent modifier les entreprises")
     
-    company_doc = await db.companies.find_one({"id": company_id})
-    if not company_doc:
-        raise HTTPException(status_code=404, detail="Entreprise non trouvée")
-    
-    await db.companies.update_one(
+    updated_company = await db.companies.find_one_and_update(
         {"id": company_id},
-        {"$set": {"name": company_update.name}}
+        {"$set": {"name": company_update.name}},
+        projection=COMPANY_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
+    if not updated_company:
+        raise HTTPException(status_code=404, detail="Entreprise non trouvée")
+    
+    company_names.put(company_id, company_update.name)
+    await bump_versions("companies")
     
-    updated_company = await db.companies.find_one({"id": company_id})
     return Company(**updated_company)
 
 # User routes
 @api_router.post("/users", response_model=UserResponse)
-async def create_user(user_create: UserCreate, current_user: User = Depends(get_current_user)):
+async def create_user(user_create: UserCreate, current_user: CurrentUser = Depends(get_current_user)):
     # Permission check
     if current_user.role == "employee":
         raise HTTPException(status_code=403, detail="Les employés ne peuvent pas créer d'utilisateurs")
     if current_user.role == "manager" and user_create.role != "employee":
         raise HTTPException(status_code=403, detail="Les managers ne peuvent créer que des employés")
     
-    # Generate unique user_id
-    user_id = generate_user_id()
-    while await db.users.find_one({"user_id": user_id}):
-        user_id = generate_user_id()
+    password_hash = await get_password_hash(user_create.password)
     
-    user_obj = User(
-        user_id=user_id,
-        identifiant=user_create.identifiant,
-        role=user_create.role,
-        password_hash=get_password_hash(user_create.password),
-        created_by=current_user.id
-    )
-    await db.users.insert_one(user_obj.dict())
+    # Generate unique user_id: insert directly and draw again only if the unique index rejects it,
+    # so the common case is a single write and concurrent creations cannot collide
+    for _ in range(USER_ID_MAX_ATTEMPTS):
+        user_obj = User(
+            user_id=generate_user_id(),
+            identifiant=user_create.identifiant,
+            role=user_create.role,
+            password_hash=password_hash,
+            created_by=current_user.id
+        )
+        try:
+            await db.users.insert_one(user_obj.dict())
+            break
+        except DuplicateKeyError as exc:
+            if "user_id" not in (exc.details or {}).get("keyPattern", {}):
+                raise
+    else:
+        raise HTTPException(status_code=503, detail="Impossible de générer un identifiant unique, veuillez réessayer")
+    
+    user_names.put(user_obj.id, user_obj.identifiant)
+    await bump_versions("users")
     
     return UserResponse(
         id=user_obj.id,
@@ -282,37 +1419,29 @@ async def create_user(user_create: UserCreate, current_user: User = Depends(get_
     )
 
 @api_router.get("/users", response_model=List[UserResponse])
-async def get_users(current_user: User = Depends(get_current_user)):
+async def get_users(request: Request, response: Response, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role not in ["admin", "manager"]:
         raise HTTPException(status_code=403, detail="Seuls les admins et managers peuvent voir les utilisateurs")
     
+    # The visible set depends on the caller's role
+    cached = await not_modified(request, response, ["users"], current_user.role)
+    if cached:
+        return cached
+    
     query = {}
     if current_user.role == "manager":
         # Managers can only see employees
         query = {"role": "employee"}
     
-    users = await db.users.find(query).to_list(1000)
-    result = []
-    for user in users:
-        # Handle migration for old users without identifiant field
-        identifiant = user.get("identifiant", user.get("name", user.get("user_id", "Unknown")))
-        
-        result.append(UserResponse(
-            id=user["id"],
-            user_id=user["user_id"],
-            identifiant=identifiant,
-            role=user["role"],
-            created_at=user["created_at"]
-        ))
-    
-    return result
+    users = await db.users.find(query, USER_PROJECTION).to_list(1000)
+    return fast_json([serialize_user(user) for user in users], response)
 
 @api_router.put("/users/{user_id}", response_model=UserResponse)
-async def update_user(user_id: str, user_update: UserUpdate, current_user: User = Depends(get_current_user)):
+async def update_user(user_id: str, user_update: UserUpdate, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Seuls les admins peuvent modifier les utilisateurs")
     
-    user_doc = await db.users.find_one({"id": user_id})
+    user_doc = await db.users.find_one({"id": user_id}, USER_PROJECTION)
     if not user_doc:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
@@ -320,13 +1449,25 @@ async def update_user(user_id: str, user_update: UserUpdate, current_user: User
     if user_update.identifiant:
         update_data["identifiant"] = user_update.identifiant
     if user_update.password:
-        update_data["password_hash"] = get_password_hash(user_update.password)
+        update_data["password_hash"] = await get_password_hash(user_update.password)
     if user_update.role:
         update_data["role"] = user_update.role
     
     if update_data:
-        await db.users.update_one({"id": user_id}, {"$set": update_data})
-        updated_user = await db.users.find_one({"id": user_id})
+        updated_user = await db.users.find_one_and_update(
+            {"id": user_id},
+            {"$set": update_data},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        if not updated_user:
+            raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+        user_cache.invalidate(user_id)
+        if "identifiant" in update_data:
+            user_names.put(user_id, update_data["identifiant"])
+        await bump_versions("users")
+        # Tokens embed role and identifiant, and a password change must log other sessions out
+        await token_versions.revoke(user_id)
         return UserResponse(
             id=updated_user["id"],
             user_id=updated_user["user_id"],
@@ -345,7 +1486,7 @@ async def update_user(user_id: str, user_update: UserUpdate, current_user: User
 
 # Payment Entry routes
 @api_router.post("/payment-entries", response_model=PaymentEntry)
-async def create_payment_entry(entry: PaymentEntryCreate, current_user: User = Depends(get_current_user)):
+async def create_payment_entry(entry: PaymentEntryCreate, current_user: CurrentUser = Depends(get_current_user)):
     entry_obj = PaymentEntry(
         company_id=entry.company_id,
         client_name=entry.client_name,
@@ -353,265 +1494,696 @@ async def create_payment_entry(entry: PaymentEntryCreate, current_user: User = D
         amount=entry.amount,
         created_by=current_user.id
     )
-    await db.payment_entries.insert_one(entry_obj.dict())
+    entry_doc = entry_obj.dict()
+    entry_doc.update(search_fields(entry_doc))
+    await db.payment_entries.insert_one(entry_doc)
+    client_names.record(entry_doc["company_id"], entry_doc["client_name"])
+    await apply_rollup_deltas(add_rollup_delta({}, entry_doc, count=1))
+    await bump_versions("payment_entries")
     return entry_obj
 
-@api_router.get("/payment-entries", response_model=List[PaymentEntryResponse])
-async def get_payment_entries(validated_only: bool = False, current_user: User = Depends(get_current_user)):
-    # Build query based on validated_only parameter
-    query = {}
-    if validated_only:
-        query = {"is_validated": True}
+def parse_import_batch(rows, first_row: int, company_ids: set, created_by: str) -> tuple:
+    """Read and validate up to IMPORT_BATCH_SIZE rows (blocking: runs in the threadpool).
     
-    entries = await db.payment_entries.find(query).to_list(1000)
+    Returns (rows read, [(row number, entry document)], [(row number, error)], whether the file is done).
+    """
+    read, documents, errors = 0, [], []
+    try:
+        for row in itertools.islice(rows, IMPORT_BATCH_SIZE):
+            row_number = first_row + read
+            read += 1
+            if not isinstance(row, dict):
+                errors.append((row_number, "Ligne invalide"))
+                continue
+            try:
+                entry = PaymentEntryCreate(**{key: value for key, value in row.items() if key})
+            except ValidationError as exc:
+                errors.append((row_number, validation_error_message(exc)))
+                continue
+            if entry.company_id not in company_ids:
+                errors.append((row_number, "Entreprise inconnue"))
+                continue
+            
+            entry_doc = PaymentEntry(**entry.dict(), created_by=created_by).dict()
+            entry_doc.update(search_fields(entry_doc))
+            documents.append((row_number, entry_doc))
+    except (ValueError, csv.Error) as exc:
+        # Malformed file: keep what was already read and report where parsing stopped
+        errors.append((first_row + read, f"Fichier illisible : {exc}"))
+        return read, documents, errors, True
+    return read, documents, errors, read < IMPORT_BATCH_SIZE
+
+@api_router.post("/payment-entries/import", response_model=ImportReport)
+async def import_payment_entries(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|json)$"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if format is None:
+        is_csv = (file.filename or "").lower().endswith(".csv") or (file.content_type or "").startswith("text/csv")
+        format = "csv" if is_csv else "json"
+    rows = iter_csv_rows(file.file) if format == "csv" else iter_json_array(file.file)
     
-    # Get related data for response
-    result = []
-    for entry in entries:
-        # Get company name
-        company = await db.companies.find_one({"id": entry["company_id"]})
-        company_name = company["name"] if company else "Entreprise inconnue"
-        
-        # Get creator name with fallback handling
-        creator = await db.users.find_one({"id": entry["created_by"]})
-        if creator:
-            created_by_name = creator.get("identifiant", creator.get("name", creator.get("user_id", "Utilisateur inconnu")))
-        else:
-            created_by_name = "Utilisateur inconnu"
-        
-        # Get validator name if validated with fallback handling
-        validated_by_name = None
-        if entry.get("validated_by"):
-            validator = await db.users.find_one({"id": entry["validated_by"]})
-            if validator:
-                validated_by_name = validator.get("identifiant", validator.get("name", validator.get("user_id", "Validateur inconnu")))
+    companies = await db.companies.find({}, {"_id": 0, "id": 1}).to_list(None)
+    company_ids = {company["id"] for company in companies}
+    
+    report = ImportReport(total_rows=0, imported=0, failed=0, errors=[])
+    
+    def add_error(row: int, error: str):
+        report.failed += 1
+        if len(report.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            report.errors.append(ImportRowError(row=row, error=error))
+    
+    async def flush(batch: List[tuple]):
+        # Unordered insert: one bad document does not stop the rest of the batch
+        documents = [document for _, document in batch]
+        failed_indexes = set()
+        try:
+            await db.payment_entries.insert_many(documents, ordered=False)
+        except BulkWriteError as exc:
+            for write_error in exc.details["writeErrors"]:
+                failed_indexes.add(write_error["index"])
+                add_error(batch[write_error["index"]][0], write_error["errmsg"])
         
-        result.append(PaymentEntryResponse(
-            id=entry["id"],
-            company_id=entry["company_id"],
-            company_name=company_name,
-            client_name=entry["client_name"],
-            invoice_number=entry["invoice_number"],
-            amount=entry["amount"],
-            created_by=entry["created_by"],
-            created_by_name=created_by_name,
-            created_at=entry["created_at"],
-            is_validated=entry["is_validated"],
-            validated_at=entry.get("validated_at"),
-            validated_by=entry.get("validated_by"),
-            validated_by_name=validated_by_name
-        ))
-    
-    return result
+        deltas = {}
+        for index, document in enumerate(documents):
+            if index not in failed_indexes:
+                add_rollup_delta(deltas, document, count=1)
+                client_names.record(document["company_id"], document["client_name"])
+        await apply_rollup_deltas(deltas)
+        await bump_versions("payment_entries")
+        report.imported += len(documents) - len(failed_indexes)
+    
+    # Parsing and validation are CPU-bound: each batch is read in the threadpool, then inserted
+    finished = False
+    while not finished:
+        read, batch, errors, finished = await run_in_threadpool(
+            parse_import_batch, rows, report.total_rows + 1, company_ids, current_user.id
+        )
+        report.total_rows += read
+        for row_number, error in errors:
+            add_error(row_number, error)
+        if batch:
+            await flush(batch)
+    
+    return report
 
-@api_router.post("/payment-entries/{entry_id}/validate")
-async def validate_payment_entry(entry_id: str, current_user: User = Depends(get_current_user)):
+def serialize_entries(entries: List[dict], fields: Optional[List[str]]) -> List[dict]:
+    if fields is None:
+        return [serialize_payment_entry(entry) for entry in entries]
+    return [serialize_sparse_payment_entry(entry, fields) for entry in entries]
+
+def ndjson_lines(entries: List[dict]) -> bytes:
+    return b"".join(orjson.dumps(entry) + b"\n" for entry in entries)
+
+async def iter_named_batches(cursor, attach_names=attach_entry_names):
+    """Read documents (payment entries by default) from the cursor in batches, with their names attached"""
+    batch = []
+    async for document in cursor:
+        batch.append(document)
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield await attach_names(batch)
+            batch = []
+    if batch:
+        yield await attach_names(batch)
+
+async def stream_payment_entries(cursor, fields: Optional[List[str]]):
+    """Yield payment entries as NDJSON lines while the cursor is iterated"""
+    async for batch in iter_named_batches(cursor):
+        yield ndjson_lines(serialize_entries(batch, fields))
+
+def csv_cell(value):
+    # Text read as a formula by spreadsheets is quoted (CSV injection)
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+async def stream_csv_export(cursor):
+    """Yield the ledger as CSV chunks, one per batch read from the cursor"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so that Excel opens the file as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(EXPORT_COLUMNS)
+    yield buffer.getvalue().encode()
+    
+    async for batch in iter_named_batches(cursor):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([csv_cell(entry.get(column)) for column in EXPORT_COLUMNS] for entry in batch)
+        yield buffer.getvalue().encode()
+
+async def write_xlsx_export(cursor, path: str):
+    """Write the ledger to an XLSX file batch by batch; constant_memory flushes each row as it is written"""
+    loop = asyncio.get_running_loop()
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "strings_to_formulas": False,
+        "strings_to_numbers": False,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss"
+    })
+    worksheet = workbook.add_worksheet("Paiements")
+    worksheet.write_row(0, 0, EXPORT_COLUMNS)
+    
+    def write_rows(first_row: int, rows: List[list]):
+        for offset, values in enumerate(rows):
+            worksheet.write_row(first_row + offset, 0, values)
+    
+    row = 1
+    try:
+        async for batch in iter_named_batches(cursor):
+            if row + len(batch) > XLSX_MAX_ROWS:
+                raise HTTPException(status_code=400, detail="Export trop volumineux pour Excel, utilisez le format CSV")
+            # xlsxwriter is synchronous: rows are written off the event loop
+            await loop.run_in_executor(None, write_rows, row, [[entry.get(column) for column in EXPORT_COLUMNS] for entry in batch])
+            row += len(batch)
+    finally:
+        await loop.run_in_executor(None, workbook.close)
+
+@api_router.get("/payment-entries/export")
+async def export_payment_entries(
+    query: dict = Depends(payment_entry_filters),
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Whole ledger matching the list filters, read from a single cursor (no page size limit)"""
+    entries_cursor = db.payment_entries.find(query, PAYMENT_ENTRY_PROJECTION).sort(
+        [("created_at", -1), ("id", -1)]
+    ).batch_size(STREAM_BATCH_SIZE)
+    filename = f"paytrack-export-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if format == "csv":
+        return StreamingResponse(stream_csv_export(entries_cursor), media_type="text/csv; charset=utf-8", headers=headers)
+    
+    # The XLSX zip container is only valid once complete: it is built in a temporary file, then sent
+    with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as handle:
+        path = handle.name
+    try:
+        await write_xlsx_export(entries_cursor, path)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return FileResponse(path, media_type=XLSX_MEDIA_TYPE, headers=headers, background=BackgroundTask(os.unlink, path))
+
+async def write_columnar_export(batches, schema: pa.Schema, path: str, format: str):
+    """Write document batches to a Parquet or Arrow IPC file, one record batch per cursor batch"""
+    loop = asyncio.get_running_loop()
+    if format == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(path, schema, compression="zstd")
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+    timestamp_fields = [field.name for field in schema if pa.types.is_timestamp(field.type)]
+    try:
+        async for batch in batches:
+            # Legacy entries may hold string dates, which the typed columns would reject
+            for document in batch:
+                for name in timestamp_fields:
+                    document[name] = coerce_datetime(document.get(name))
+            record_batch = pa.RecordBatch.from_pylist(batch, schema=schema)
+            # Encoding and compression are CPU-bound: off the event loop
+            await loop.run_in_executor(None, writer.write_batch, record_batch)
+    finally:
+        await loop.run_in_executor(None, writer.close)
+
+async def columnar_export_response(batches, schema: pa.Schema, format: str, dataset: str) -> FileResponse:
+    # Parquet and Arrow files carry their footer at the end: built in a temporary file, then sent
+    with tempfile.NamedTemporaryFile(suffix=f".{format}", delete=False) as handle:
+        path = handle.name
+    try:
+        await write_columnar_export(batches, schema, path, format)
+    except BaseException:
+        os.unlink(path)
+        raise
+    filename = f"paytrack-{dataset}-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return FileResponse(
+        path,
+        media_type=COLUMNAR_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        background=BackgroundTask(os.unlink, path)
+    )
+
+@api_router.get("/exports/payment-entries")
+async def export_payment_entries_columnar(
+    query: dict = Depends(payment_entry_filters),
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Seuls les admins peuvent exporter les données")
+    
+    entries_cursor = db.payment_entries.find(query, PAYMENT_ENTRY_PROJECTION).sort(
+        [("created_at", -1), ("id", -1)]
+    ).batch_size(STREAM_BATCH_SIZE)
+    return await columnar_export_response(iter_named_batches(entries_cursor), PAYMENT_ENTRY_SCHEMA, format, "payment-entries")
+
+@api_router.get("/exports/reminders")
+async def export_reminders_columnar(
+    format: str = Query("parquet", pattern="^(parquet|arrow)$"),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Seuls les admins peuvent exporter les données")
+    
+    # Grouped by entry, in the order of the payment_entry_id_triggered_at index (no in-memory sort)
+    reminders_cursor = db.reminders.find({}, REMINDER_PROJECTION).sort(
+        [("payment_entry_id", 1), ("triggered_at", -1), ("id", -1)]
+    ).batch_size(STREAM_BATCH_SIZE)
+    return await columnar_export_response(
+        iter_named_batches(reminders_cursor, attach_reminder_names), REMINDER_SCHEMA, format, "reminders"
+    )
+
+def search_rank_expression(term: str) -> dict:
+    """3 for an exact match of either key, 2 for a prefix, 1 for a substring, 0 for a trigram false positive"""
+    # $literal: a term starting with "$" must not be read as a field path
+    term = {"$literal": term}
+    return {
+        "$max": {
+            "$map": {
+                "input": "$search_keys",
+                "as": "key",
+                "in": {
+                    "$switch": {
+                        "branches": [
+                            {"case": {"$eq": ["$$key", term]}, "then": 3},
+                            {"case": {"$eq": [{"$indexOfCP": ["$$key", term]}, 0]}, "then": 2},
+                            {"case": {"$gt": [{"$indexOfCP": ["$$key", term]}, 0]}, "then": 1}
+                        ],
+                        "default": 0
+                    }
+                }
+            }
+        }
+    }
+
+@api_router.get("/payment-entries/search", response_model=List[PaymentEntryResponse])
+async def search_payment_entries(
+    q: str = Query(..., min_length=1, max_length=100),
+    query: dict = Depends(payment_entry_filters),
+    limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=SEARCH_MAX_CANDIDATES),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    term = normalize_search_text(q)
+    if not term:
+        return fast_json([])
+    
+    # Every trigram of the term must be present; terms too short to have one match as prefixes
+    if len(term) >= SEARCH_GRAM_SIZE:
+        match = {"search_grams": {"$all": sorted(search_grams(term))}}
+    else:
+        match = {"search_keys": {"$regex": f"^{re.escape(term)}"}}
+    
+    entries = await db.payment_entries.aggregate([
+        {"$match": {"$and": [query, match]}},
+        {"$limit": SEARCH_MAX_CANDIDATES},
+        {"$addFields": {"search_rank": search_rank_expression(term)}},
+        # Trigrams spread over both keys, or in the wrong order, are not a match
+        {"$match": {"search_rank": {"$gt": 0}}},
+        {"$sort": {"search_rank": -1, "created_at": -1, "id": -1}},
+        {"$skip": offset},
+        {"$limit": limit},
+        {"$project": PAYMENT_ENTRY_PROJECTION}
+    ]).to_list(limit)
+    
+    return fast_json([serialize_payment_entry(entry) for entry in await attach_entry_names(entries)])
+
+@api_router.get("/payment-entries", response_model=List[PaymentEntryResponse])
+async def get_payment_entries(
+    request: Request,
+    response: Response,
+    query: dict = Depends(payment_entry_filters),
+    sort: str = Query("-created_at", pattern=PAYMENT_ENTRY_SORT_PATTERN),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Champs à renvoyer, séparés par des virgules (id toujours inclus)"),
+    accept: Optional[str] = Header(None),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    selected_fields = parse_entry_fields(fields)
+    sort_field = sort.lstrip("-")
+    descending = sort.startswith("-")
+    direction = -1 if descending else 1
+    
+    # Keyset pagination on (sort field, id): id breaks ties between identical values
+    if cursor:
+        query = {"$and": [query, keyset_after(decode_cursor(cursor, sort), sort_field, descending)]}
+    
+    entries_cursor = db.payment_entries.find(query, entry_projection(selected_fields, sort_field)).sort(
+        [(sort_field, direction), ("id", direction)]
+    )
+    
+    # Streaming mode: one JSON document per line, sent as the cursor is read.
+    # Without an explicit limit the whole ledger from the cursor onwards is streamed.
+    if accept and NDJSON_MEDIA_TYPE in accept:
+        if limit:
+            entries_cursor = entries_cursor.limit(limit)
+        entries_cursor = entries_cursor.batch_size(STREAM_BATCH_SIZE)
+        return StreamingResponse(stream_payment_entries(entries_cursor, selected_fields), media_type=NDJSON_MEDIA_TYPE)
+    
+    # Names are part of the payload, so company and user changes also change the ETag
+    cached = await not_modified(request, response, ["payment_entries", "companies", "users"])
+    if cached:
+        return cached
+    
+    limit = limit or DEFAULT_PAGE_SIZE
+    entries = await entries_cursor.limit(limit + 1).to_list(limit + 1)
+    
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.get(sort_field), last["id"], sort)
+    
+    # Company and user names come from the in-memory directories
+    return fast_json(serialize_entries(await attach_entry_names(entries), selected_fields), response)
+
+@api_router.post("/payment-entries/validate", response_model=BulkValidateReport)
+async def validate_payment_entries(request: BulkValidateRequest, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role not in ["manager", "admin"]:
         raise HTTPException(status_code=403, detail="Seuls les managers et admins peuvent valider les entrées")
     
-    entry = await db.payment_entries.find_one({"id": entry_id})
-    if not entry:
-        raise HTTPException(status_code=404, detail="Entrée de paiement non trouvée")
+    scope = {}
+    if request.ids is not None:
+        scope["id"] = {"$in": request.ids}
+    if request.company_id:
+        scope["company_id"] = request.company_id
+    if request.start_date or request.end_date:
+        scope["created_at"] = {}
+        if request.start_date:
+            scope["created_at"]["$gte"] = request.start_date
+        if request.end_date:
+            scope["created_at"]["$lte"] = request.end_date
+    if not scope or request.ids == []:
+        raise HTTPException(status_code=400, detail="Aucune entrée sélectionnée")
     
-    if entry["is_validated"]:
-        raise HTTPException(status_code=400, detail="Entrée déjà validée")
-    
-    await db.payment_entries.update_one(
-        {"id": entry_id},
+    # Marker unique to this request: the entries carrying it are exactly the ones it validated,
+    # even when the same manager sends the same validation twice at once (double click, retry)
+    validation_batch = str(uuid.uuid4())
+    await db.payment_entries.update_many(
+        {**scope, "is_validated": False},
         {
             "$set": {
                 "is_validated": True,
                 "validated_at": datetime.utcnow(),
-                "validated_by": current_user.id
+                "validated_by": current_user.id,
+                "validation_batch": validation_batch
             }
         }
     )
     
-    return {"message": "Entrée validée avec succès"}
+    # Requested ids are read back without the filters, so that existing entries the filters left out
+    # are reported as out of scope rather than missing
+    projection = {"_id": 0, "id": 1, "amount": 1, "company_id": 1, "created_by": 1, "created_at": 1, "is_validated": 1, "validation_batch": 1}
+    if request.ids is not None:
+        entries = await db.payment_entries.find({"id": {"$in": request.ids}}, projection).to_list(None)
+    else:
+        entries = await db.payment_entries.find({"validation_batch": validation_batch}, projection).to_list(None)
+    
+    validated, already_validated, out_of_scope = [], [], []
+    deltas = {}
+    for entry in entries:
+        if entry.get("validation_batch") == validation_batch:
+            validated.append(entry["id"])
+            add_rollup_delta(deltas, entry, validated=1)
+        elif entry.get("is_validated"):
+            already_validated.append(entry["id"])
+        else:
+            out_of_scope.append(entry["id"])
+    await apply_rollup_deltas(deltas)
+    if validated:
+        # The marker is only needed for the read-back above; the sparse index stays small
+        await db.payment_entries.update_many({"validation_batch": validation_batch}, {"$unset": {"validation_batch": ""}})
+        await bump_versions("payment_entries")
+    
+    found = {entry["id"] for entry in entries}
+    missing = [entry_id for entry_id in dict.fromkeys(request.ids or []) if entry_id not in found]
+    
+    return BulkValidateReport(
+        validated=validated, already_validated=already_validated, missing=missing, out_of_scope=out_of_scope
+    )
 
-@api_router.put("/payment-entries/{entry_id}")
-async def update_payment_entry(entry_id: str, entry_update: PaymentEntryCreate, current_user: User = Depends(get_current_user)):
-    entry = await db.payment_entries.find_one({"id": entry_id})
-    if not entry:
+async def raise_for_unmatched_entry(entry_id: str, validated_detail: str):
+    """A write conditioned on is_validated: false matched nothing: tell a missing entry (404) from a validated one (400)"""
+    if await db.payment_entries.find_one({"id": entry_id}, EXISTS_PROJECTION) is None:
         raise HTTPException(status_code=404, detail="Entrée de paiement non trouvée")
+    raise HTTPException(status_code=400, detail=validated_detail)
+
+@api_router.post("/payment-entries/{entry_id}/validate")
+async def validate_payment_entry(entry_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    if current_user.role not in ["manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Seuls les managers et admins peuvent valider les entrées")
     
-    if entry["is_validated"]:
-        raise HTTPException(status_code=400, detail="Impossible de modifier une entrée validée")
-    
-    await db.payment_entries.update_one(
-        {"id": entry_id},
+    # Single conditional write: two managers validating at once cannot both succeed
+    entry = await db.payment_entries.find_one_and_update(
+        {"id": entry_id, "is_validated": False},
         {
             "$set": {
-                "company_id": entry_update.company_id,
-                "client_name": entry_update.client_name,
-                "invoice_number": entry_update.invoice_number,
-                "amount": entry_update.amount
+                "is_validated": True,
+                "validated_at": datetime.utcnow(),
+                "validated_by": current_user.id
             }
-        }
+        },
+        projection=ROLLUP_PROJECTION
+    )
+    if entry is None:
+        await raise_for_unmatched_entry(entry_id, "Entrée déjà validée")
+    
+    await apply_rollup_deltas(add_rollup_delta({}, entry, validated=1))
+    await bump_versions("payment_entries")
+    
+    return {"message": "Entrée validée avec succès"}
+
+@api_router.put("/payment-entries/{entry_id}")
+async def update_payment_entry(entry_id: str, entry_update: PaymentEntryCreate, current_user: CurrentUser = Depends(get_current_user)):
+    update_data = {
+        "company_id": entry_update.company_id,
+        "client_name": entry_update.client_name,
+        "invoice_number": entry_update.invoice_number,
+        "amount": entry_update.amount
+    }
+    # Returns the document as it was before the update, for the rollup adjustment
+    entry = await db.payment_entries.find_one_and_update(
+        {"id": entry_id, "is_validated": False},
+        {"$set": {**update_data, **search_fields(update_data)}},
+        projection=ENTRY_CHANGE_PROJECTION,
+        return_document=ReturnDocument.BEFORE
     )
+    if entry is None:
+        await raise_for_unmatched_entry(entry_id, "Impossible de modifier une entrée validée")
+    
+    # Move the entry out of its old groups and into the new ones; unchanged keys cancel out
+    deltas = add_rollup_delta({}, entry, count=-1)
+    add_rollup_delta(deltas, {**entry, **update_data}, count=1)
+    await apply_rollup_deltas(deltas)
+    client_names.record(entry["company_id"], entry["client_name"], -1)
+    client_names.record(update_data["company_id"], update_data["client_name"])
+    await bump_versions("payment_entries")
     
     return {"message": "Entrée modifiée avec succès"}
 
 @api_router.delete("/payment-entries/{entry_id}")
-async def delete_payment_entry(entry_id: str, current_user: User = Depends(get_current_user)):
-    entry = await db.payment_entries.find_one({"id": entry_id})
-    if not entry:
-        raise HTTPException(status_code=404, detail="Entrée de paiement non trouvée")
-    
-    if entry["is_validated"]:
-        raise HTTPException(status_code=400, detail="Impossible de supprimer une entrée validée")
+async def delete_payment_entry(entry_id: str, current_user: CurrentUser = Depends(get_current_user)):
+    entry = await db.payment_entries.find_one_and_delete(
+        {"id": entry_id, "is_validated": False},
+        projection=ENTRY_CHANGE_PROJECTION
+    )
+    if entry is None:
+        await raise_for_unmatched_entry(entry_id, "Impossible de supprimer une entrée validée")
     
-    await db.payment_entries.delete_one({"id": entry_id})
+    await apply_rollup_deltas(add_rollup_delta({}, entry, count=-1))
+    client_names.record(entry["company_id"], entry["client_name"], -1)
+    await bump_versions("payment_entries")
     return {"message": "Entrée supprimée avec succès"}
 
+@api_router.get("/client-names", response_model=List[str])
+async def autocomplete_client_names(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    company_id: Optional[str] = None,
+    limit: int = Query(AUTOCOMPLETE_DEFAULT_LIMIT, ge=1, le=AUTOCOMPLETE_MAX_LIMIT),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    # Served from memory: no database round trip per keystroke
+    return fast_json(await client_names.suggest(prefix, company_id, limit))
+
 # Relance routes
 @api_router.post("/reminders", response_model=Reminder)
-async def create_relance(reminder: ReminderCreate, current_user: User = Depends(get_current_user)):
+async def create_relance(reminder: ReminderCreate, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role not in ["manager", "admin"]:
         raise HTTPException(status_code=403, detail="Seuls les managers et admins peuvent créer des relances")
     
-    # Check if payment entry exists and is not validated
-    entry = await db.payment_entries.find_one({"id": reminder.payment_entry_id})
-    if not entry:
-        raise HTTPException(status_code=404, detail="Entrée de paiement non trouvée")
-    
-    if entry["is_validated"]:
-        raise HTTPException(status_code=400, detail="Impossible de créer une relance pour une entrée validée")
-    
     reminder_obj = Reminder(
         payment_entry_id=reminder.payment_entry_id,
         triggered_by=current_user.id,
         note=reminder.note
     )
+    
+    # Bumping the entry's counters doubles as the atomic "exists and is not validated" check
+    result = await db.payment_entries.update_one(
+        {"id": reminder.payment_entry_id, "is_validated": False},
+        {
+            "$inc": {"reminder_count": 1},
+            # $max: a concurrent, earlier reminder landing second must not move it backwards
+            "$max": {"last_reminder_at": reminder_obj.triggered_at}
+        }
+    )
+    if result.matched_count == 0:
+        await raise_for_unmatched_entry(reminder.payment_entry_id, "Impossible de créer une relance pour une entrée validée")
+    
     await db.reminders.insert_one(reminder_obj.dict())
+    await bump_versions("payment_entries", "reminders")
     return reminder_obj
 
 @api_router.get("/reminders/{payment_entry_id}", response_model=List[ReminderResponse])
-async def get_relances_for_entry(payment_entry_id: str, current_user: User = Depends(get_current_user)):
+async def get_relances_for_entry(
+    payment_entry_id: str,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user)
+):
     if current_user.role not in ["manager", "admin"]:
         raise HTTPException(status_code=403, detail="Seuls les managers et admins peuvent voir les relances")
     
-    reminders = await db.reminders.find({"payment_entry_id": payment_entry_id}).to_list(1000)
+    # Most recent first, paginated with the same keyset cursors as payment entries
+    query = {"payment_entry_id": payment_entry_id}
+    if cursor:
+        query = {"$and": [query, keyset_after(decode_cursor(cursor, REMINDER_SORT), "triggered_at")]}
     
-    result = []
+    reminders = await db.reminders.find(query, REMINDER_PROJECTION).sort(
+        [("triggered_at", -1), ("id", -1)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    if len(reminders) > limit:
+        reminders = reminders[:limit]
+        last = reminders[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["triggered_at"], last["id"], REMINDER_SORT)
+    
+    return fast_json([serialize_reminder(reminder) for reminder in await attach_reminder_names(reminders)], response)
+
+@api_router.post("/reminders/batch", response_model=List[ReminderHistory])
+async def get_relances_for_entries(request: ReminderBatchRequest, current_user: CurrentUser = Depends(get_current_user)):
+    if current_user.role not in ["manager", "admin"]:
+        raise HTTPException(status_code=403, detail="Seuls les managers et admins peuvent voir les relances")
+    
+    # One pipeline for every entry: the $lookup reads the first page of each history from the
+    # payment_entry_id_triggered_at index, so the cost does not grow with the length of the histories.
+    # An extra reminder per entry is kept to know whether a next page exists; names come from the user directory.
+    pipeline = [
+        {"$match": {"id": {"$in": request.payment_entry_ids}}},
+        {"$project": {"_id": 0, "id": 1}},
+        {"$lookup": {
+            "from": "reminders",
+            "localField": "id",
+            "foreignField": "payment_entry_id",
+            "pipeline": [
+                {"$sort": {"triggered_at": -1, "id": -1}},
+                {"$limit": request.limit + 1},
+                {"$project": REMINDER_PROJECTION}
+            ],
+            "as": "reminders"
+        }},
+        {"$unwind": "$reminders"},
+        {"$replaceRoot": {"newRoot": "$reminders"}}
+    ]
+    reminders = await attach_reminder_names(await db.payment_entries.aggregate(pipeline).to_list(None))
+    
+    by_entry = {}
     for reminder in reminders:
-        # Get triggered by user name with fallback handling
-        user = await db.users.find_one({"id": reminder["triggered_by"]})
-        if user:
-            triggered_by_name = user.get("identifiant", user.get("name", user.get("user_id", "Utilisateur inconnu")))
-        else:
-            triggered_by_name = "Utilisateur inconnu"
-        
-        result.append(ReminderResponse(
-            id=reminder["id"],
-            payment_entry_id=reminder["payment_entry_id"],
-            triggered_by=reminder["triggered_by"],
-            triggered_by_name=triggered_by_name,
-            triggered_at=reminder["triggered_at"],
-            note=reminder.get("note")
-        ))
+        by_entry.setdefault(reminder["payment_entry_id"], []).append(reminder)
     
-    return result
+    result = []
+    for payment_entry_id in dict.fromkeys(request.payment_entry_ids):
+        entry_reminders = sorted(by_entry.get(payment_entry_id, []), key=lambda r: (r["triggered_at"], r["id"]), reverse=True)
+        next_cursor = None
+        if len(entry_reminders) > request.limit:
+            entry_reminders = entry_reminders[:request.limit]
+            next_cursor = encode_cursor(entry_reminders[-1]["triggered_at"], entry_reminders[-1]["id"], REMINDER_SORT)
+        result.append({
+            "payment_entry_id": payment_entry_id,
+            "reminders": [serialize_reminder(reminder) for reminder in entry_reminders],
+            "next_cursor": next_cursor
+        })
+    
+    return fast_json(result)
 
 # Analytics route
+def merge_groups_by_name(groups: List[dict]) -> List[dict]:
+    """Combine groups whose ids resolve to the same display name, as the dashboard groups by name"""
+    merged = {}
+    for group in groups:
+        name = group["name"]
+        if name not in merged:
+            merged[name] = {"name": name, "count": 0, "amount": 0, "validated": 0}
+        merged[name]["count"] += group["count"]
+        merged[name]["amount"] += group["amount"]
+        merged[name]["validated"] += group["validated"]
+    return list(merged.values())
+
 @api_router.get("/analytics", response_model=AnalyticsData)
-async def get_analytics(current_user: User = Depends(get_current_user)):
+async def get_analytics(request: Request, response: Response, current_user: CurrentUser = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Seuls les admins peuvent voir les analyses")
     
-    # Get all entries
-    all_entries = await db.payment_entries.find().to_list(1000)
-    
-    # Basic stats
-    total_entries = len(all_entries)
-    validated_entries = len([e for e in all_entries if e["is_validated"]])
-    pending_entries = total_entries - validated_entries
-    total_amount = sum(e["amount"] for e in all_entries)
-    validated_amount = sum(e["amount"] for e in all_entries if e["is_validated"])
-    pending_amount = total_amount - validated_amount
-    
-    # Get company data for grouping with fallback handling
-    companies = await db.companies.find().to_list(1000)
-    company_map = {c["id"]: c["name"] for c in companies}
-    
-    # Get user data for grouping with fallback handling
-    users = await db.users.find().to_list(1000)
-    user_map = {}
-    for u in users:
-        identifiant = u.get("identifiant", u.get("name", u.get("user_id", "Utilisateur inconnu")))
-        user_map[u["id"]] = identifiant
-    
-    # Group by company with safe access
-    by_company = {}
-    for entry in all_entries:
-        company_name = company_map.get(entry["company_id"], "Entreprise inconnue")
-        if company_name not in by_company:
-            by_company[company_name] = {"count": 0, "amount": 0, "validated": 0}
-        by_company[company_name]["count"] += 1
-        by_company[company_name]["amount"] += entry["amount"]
-        if entry["is_validated"]:
-            by_company[company_name]["validated"] += 1
-    
-    # Group by employee with safe access
-    by_employee = {}
-    for entry in all_entries:
-        employee_name = user_map.get(entry["created_by"], "Employé inconnu")
-        if employee_name not in by_employee:
-            by_employee[employee_name] = {"count": 0, "amount": 0, "validated": 0}
-        by_employee[employee_name]["count"] += 1
-        by_employee[employee_name]["amount"] += entry["amount"]
-        if entry["is_validated"]:
-            by_employee[employee_name]["validated"] += 1
-    
-    # Group by month with safe date handling
-    by_month = {}
-    for entry in all_entries:
-        try:
-            if isinstance(entry["created_at"], str):
-                # Handle string dates
-                from datetime import datetime
-                created_date = datetime.fromisoformat(entry["created_at"].replace('Z', '+00:00'))
-            else:
-                created_date = entry["created_at"]
-            
-            month_key = created_date.strftime("%Y-%m")
-            if month_key not in by_month:
-                by_month[month_key] = {"count": 0, "amount": 0, "validated": 0}
-            by_month[month_key]["count"] += 1
-            by_month[month_key]["amount"] += entry["amount"]
-            if entry["is_validated"]:
-                by_month[month_key]["validated"] += 1
-        except Exception:
-            # Fallback for problematic dates
-            month_key = "Date inconnue"
-            if month_key not in by_month:
-                by_month[month_key] = {"count": 0, "amount": 0, "validated": 0}
-            by_month[month_key]["count"] += 1
-            by_month[month_key]["amount"] += entry["amount"]
-            if entry["is_validated"]:
-                by_month[month_key]["validated"] += 1
-    
-    # Convert to lists for response
-    by_company_list = [{"name": k, **v} for k, v in by_company.items()]
-    by_employee_list = [{"name": k, **v} for k, v in by_employee.items()]
-    by_month_list = [{"name": k, **v} for k, v in by_month.items()]
+    # analytics_rollups: bumped by rebuilds, which change the figures without any entry write
+    cached = await not_modified(request, response, ["payment_entries", "companies", "users", "analytics_rollups"])
+    if cached:
+        return cached
+    
+    # Rollups are built at startup; until then the figures are aggregated from the ledger
+    if await rollup_state.ready():
+        rollups = await db.analytics_rollups.find(
+            {"dimension": {"$in": list(ROLLUP_DIMENSIONS)}}, ROLLUP_READ_PROJECTION
+        ).to_list(None)
+    else:
+        rollups = await compute_rollups()
+    
+    by_dimension = {dimension: [] for dimension in ROLLUP_DIMENSIONS}
+    for rollup in rollups:
+        if rollup["count"] > 0:
+            by_dimension[rollup["dimension"]].append(rollup)
+    totals = by_dimension["total"][0] if by_dimension["total"] else dict.fromkeys(ROLLUP_FIELDS, 0)
+    
+    # Resolve names for the groups only, with fallback handling
+    companies = await company_names.resolve(r["key"] for r in by_dimension["company"])
+    users = await user_names.resolve(r["key"] for r in by_dimension["employee"])
+    for rollup in by_dimension["company"]:
+        rollup["name"] = companies.get(rollup["key"]) or "Entreprise inconnue"
+    for rollup in by_dimension["employee"]:
+        rollup["name"] = users.get(rollup["key"]) or "Employé inconnu"
+    for rollup in by_dimension["month"]:
+        rollup["name"] = rollup["key"]
+    by_dimension["month"].sort(key=lambda r: r["name"])
     
     return AnalyticsData(
-        total_entries=total_entries,
-        validated_entries=validated_entries,
-        pending_entries=pending_entries,
-        total_amount=total_amount,
-        validated_amount=validated_amount,
-        pending_amount=pending_amount,
-        by_company=by_company_list,
-        by_employee=by_employee_list,
-        by_month=by_month_list
+        total_entries=totals["count"],
+        validated_entries=totals["validated"],
+        pending_entries=totals["count"] - totals["validated"],
+        total_amount=totals["amount"],
+        validated_amount=totals["validated_amount"],
+        pending_amount=totals["amount"] - totals["validated_amount"],
+        by_company=merge_groups_by_name(by_dimension["company"]),
+        by_employee=merge_groups_by_name(by_dimension["employee"]),
+        by_month=merge_groups_by_name(by_dimension["month"])
     )
 
+# Metrics route
+@api_router.get("/metrics")
+async def get_metrics(current_user: CurrentUser = Depends(get_current_user)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Seuls les admins peuvent voir les métriques")
+    
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hashing": password_hash_pool.stats(),
+        "company_names": company_names.stats(),
+        "user_names": user_names.stats(),
+        "client_names": client_names.stats()
+    }
+
 # Initialize default admin user (only accessible once)
 @api_router.post("/init")
 async def initialize_system():
-    existing_admin = await db.users.find_one({"role": "admin"})
+    existing_admin = await db.users.find_one({"role": "admin"}, EXISTS_PROJECTION)
     if existing_admin:
         raise HTTPException(status_code=400, detail="Système déjà initialisé")
     
@@ -619,9 +2191,10 @@ async def initialize_system():
         user_id="ADMIN1",
         identifiant="Administrateur",
         role="admin",
-        password_hash=get_password_hash("admin123")
+        password_hash=await get_password_hash("admin123")
     )
     await db.users.insert_one(admin_user.dict())
+    await bump_versions("users")
     return {
         "message": "Système initialisé avec succès",
         "user_id": "ADMIN1",
@@ -638,6 +2211,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],
 )
 
 # Configure logging
@@ -647,6 +2221,48 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def missing_indexes() -> dict:
+    """Declared indexes not yet present, by collection name"""
+    missing = {}
+    for collection_name, indexes in REQUIRED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        absent = [index for index in indexes if index.document["name"] not in existing]
+        if absent:
+            missing[collection_name] = absent
+    return missing
+
+async def ensure_indexes():
+    for collection_name, indexes in (await missing_indexes()).items():
+        names = [index.document["name"] for index in indexes]
+        logger.warning("Missing indexes on %s: %s, creating them", collection_name, ", ".join(names))
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except OperationFailure as exc:
+            # e.g. duplicate values preventing a unique index; the app still starts
+            logger.error("Could not create indexes on %s: %s", collection_name, exc)
+    
+    # Builds started by another process (or still running) are only reported
+    try:
+        operations = await client.admin.command("currentOp", {"command.createIndexes": {"$exists": True}})
+        for operation in operations.get("inprog", []):
+            logger.info("Index build in progress: %s", operation.get("command"))
+    except OperationFailure:
+        pass
+    
+    still_missing = await missing_indexes()
+    for collection_name, indexes in still_missing.items():
+        names = [index.document["name"] for index in indexes]
+        logger.warning("Indexes still unavailable on %s: %s", collection_name, ", ".join(names))
+
+@app.on_event("startup")
+async def startup_db_client():
+    await ensure_indexes()
+    await ensure_rollups()
+    # Can take a while on a large ledger: the app serves requests meanwhile
+    spawn(backfill_search_fields(), "Search fields backfill")
+    spawn(backfill_reminder_counters(), "Reminder counters backfill")
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    client.close()
+    password_hash_pool.executor.shutdown(wait=False)
\ No newline at end of file
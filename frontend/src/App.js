@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { BrowserRouter, Routes, Route, Navigate } from 'react-router-dom';
 import axios from 'axios';
 import { Button } from './components/ui/button.jsx';
@@ -39,6 +39,34 @@ const API = `${BACKEND_URL}/api`;
 // Set up axios defaults
 axios.defaults.headers.common['Content-Type'] = 'application/json';
 
+const PAGE_SIZE = 200;
+
+// Load payment entries page by page, following the cursor returned by the API.
+// onPage receives the accumulated entries after each page so lists render incrementally;
+// returning false from it stops the loading (e.g. when the filters changed meanwhile).
+async function fetchPaymentEntryPages(params, onPage) {
+  let entries = [];
+  let cursor;
+  do {
+    const response = await axios.get(`${API}/payment-entries`, {
+      params: { ...params, limit: PAGE_SIZE, cursor }
+    });
+    entries = entries.concat(response.data);
+    if (onPage(entries) === false) break;
+    cursor = response.headers['x-next-cursor'];
+  } while (cursor);
+  return entries;
+}
+
+// Company and date range filters are applied by the API; the date field depends on the tab.
+function paymentEntryFilterParams(selectedCompany, startDate, endDate, dateField) {
+  const params = {};
+  if (selectedCompany && selectedCompany !== 'all') params.company_id = selectedCompany;
+  if (startDate) params[`${dateField}_from`] = `${startDate}T00:00:00`;
+  if (endDate) params[`${dateField}_to`] = `${endDate}T23:59:59`;
+  return params;
+}
+
 // Custom Confirmation Modal Component
 function ConfirmModal({ isOpen, onClose, onConfirm, title, message, type = 'danger' }) {
   if (!isOpen) return null;
@@ -344,13 +372,15 @@ function PendingEntriesTab({ user }) {
   const [startDate, setStartDate] = useState('');
   const [endDate, setEndDate] = useState('');
 
+  const entriesRequest = useRef(0);
+
   useEffect(() => {
-    Promise.all([fetchEntries(), fetchCompanies()]).finally(() => setLoading(false));
+    fetchCompanies();
   }, []);
 
   useEffect(() => {
     applyFilters();
-  }, [entries, searchTerm, selectedCompany, startDate, endDate]);
+  }, [entries, searchTerm]);
 
   const applyFilters = () => {
     let filtered = [...entries];
@@ -365,31 +395,26 @@ function PendingEntriesTab({ user }) {
       );
     }
 
-    // Company filter
-    if (selectedCompany && selectedCompany !== 'all') {
-      filtered = filtered.filter(entry => entry.company_id === selectedCompany);
-    }
-
-    // Date range filter
-    if (startDate) {
-      filtered = filtered.filter(entry => new Date(entry.created_at) >= new Date(startDate));
-    }
-    if (endDate) {
-      filtered = filtered.filter(entry => new Date(entry.created_at) <= new Date(endDate + 'T23:59:59'));
-    }
-
     setFilteredEntries(filtered);
   };
 
   useEffect(() => {
-    Promise.all([fetchEntries(), fetchCompanies()]).finally(() => setLoading(false));
-  }, []);
+    fetchEntries().finally(() => setLoading(false));
+  }, [selectedCompany, startDate, endDate]);
 
   const fetchEntries = async () => {
+    const request = ++entriesRequest.current;
+    const params = {
+      is_validated: false,
+      ...paymentEntryFilterParams(selectedCompany, startDate, endDate, 'created_at')
+    };
     try {
-      const response = await axios.get(`${API}/payment-entries`);
-      // Filter only pending entries
-      setEntries(response.data.filter(entry => !entry.is_validated));
+      await fetchPaymentEntryPages(params, (loaded) => {
+        // Ignore pages of a request superseded by a filter change
+        if (request !== entriesRequest.current) return false;
+        setEntries(loaded);
+        setLoading(false);
+      });
     } catch (error) {
       console.error('Failed to fetch entries:', error);
     }
@@ -425,6 +450,17 @@ function PendingEntriesTab({ user }) {
     });
   };
 
+  const handleValidateAll = () => {
+    setConfirmModal({
+      isOpen: true,
+      action: 'validate-all',
+      entryId: null,
+      title: 'Valider les entrées',
+      message: `Êtes-vous sûr de vouloir valider les ${filteredEntries.length} entrée(s) affichée(s) ?`,
+      type: 'confirm'
+    });
+  };
+
   const confirmAction = async () => {
     const { action, entryId } = confirmModal;
     
@@ -433,6 +469,10 @@ function PendingEntriesTab({ user }) {
         await axios.delete(`${API}/payment-entries/${entryId}`);
       } else if (action === 'validate') {
         await axios.post(`${API}/payment-entries/${entryId}/validate`);
+      } else if (action === 'validate-all') {
+        await axios.post(`${API}/payment-entries/validate`, {
+          ids: filteredEntries.map(entry => entry.id)
+        });
       }
       fetchEntries();
     } catch (error) {
@@ -449,6 +489,7 @@ function PendingEntriesTab({ user }) {
         payment_entry_id: entryId,
         note: note || undefined
       });
+      fetchEntries();
       // Show success with custom modal - no alert()
     } catch (error) {
       console.error('Failed to create relance:', error);
@@ -463,7 +504,15 @@ function PendingEntriesTab({ user }) {
     <div className="space-y-6">
       <div className="flex justify-between items-center">
         <h2 className="text-2xl font-bold text-slate-900">Entrées de paiement en attente</h2>
-        <CreateEntryDialog companies={companies} onSuccess={fetchEntries} />
+        <div className="flex gap-2">
+          {(user.role === 'manager' || user.role === 'admin') && filteredEntries.length > 0 && (
+            <Button onClick={handleValidateAll} className="bg-green-600 hover:bg-green-700">
+              <CheckCircle className="h-4 w-4 mr-2" />
+              Valider tout ({filteredEntries.length})
+            </Button>
+          )}
+          <CreateEntryDialog companies={companies} onSuccess={fetchEntries} />
+        </div>
       </div>
       
       {/* Filter Section */}
@@ -597,6 +646,9 @@ function PendingEntriesTab({ user }) {
                               <Button variant="outline" size="sm">
                                 <Bell className="h-4 w-4 mr-1" />
                                 Relance
+                                {entry.reminder_count > 0 && (
+                                  <Badge variant="secondary" className="ml-1">{entry.reminder_count}</Badge>
+                                )}
                               </Button>
                             }
                           />
@@ -642,13 +694,19 @@ function ValidatedEntriesTab({ user }) {
   const [startDate, setStartDate] = useState('');
   const [endDate, setEndDate] = useState('');
 
+  const entriesRequest = useRef(0);
+
   useEffect(() => {
-    Promise.all([fetchValidatedEntries(), fetchCompanies()]).finally(() => setLoading(false));
+    fetchCompanies();
   }, []);
 
+  useEffect(() => {
+    fetchValidatedEntries().finally(() => setLoading(false));
+  }, [selectedCompany, startDate, endDate]);
+
   useEffect(() => {
     applyFilters();
-  }, [entries, searchTerm, selectedCompany, startDate, endDate]);
+  }, [entries, searchTerm]);
 
   const applyFilters = () => {
     let filtered = [...entries];
@@ -664,26 +722,23 @@ function ValidatedEntriesTab({ user }) {
       );
     }
 
-    // Company filter
-    if (selectedCompany && selectedCompany !== 'all') {
-      filtered = filtered.filter(entry => entry.company_id === selectedCompany);
-    }
-
-    // Date range filter (validation date)
-    if (startDate) {
-      filtered = filtered.filter(entry => new Date(entry.validated_at) >= new Date(startDate));
-    }
-    if (endDate) {
-      filtered = filtered.filter(entry => new Date(entry.validated_at) <= new Date(endDate + 'T23:59:59'));
-    }
-
     setFilteredEntries(filtered);
   };
 
   const fetchValidatedEntries = async () => {
+    const request = ++entriesRequest.current;
+    const params = {
+      validated_only: true,
+      sort: '-validated_at',
+      ...paymentEntryFilterParams(selectedCompany, startDate, endDate, 'validated_at')
+    };
     try {
-      const response = await axios.get(`${API}/payment-entries?validated_only=true`);
-      setEntries(response.data);
+      await fetchPaymentEntryPages(params, (loaded) => {
+        // Ignore pages of a request superseded by a filter change
+        if (request !== entriesRequest.current) return false;
+        setEntries(loaded);
+        setLoading(false);
+      });
     } catch (error) {
       console.error('Failed to fetch validated entries:', error);
     }
@@ -1395,6 +1450,31 @@ function CreateEntryDialog({ companies, onSuccess }) {
     amount: ''
   });
   const [loading, setLoading] = useState(false);
+  const [clientSuggestions, setClientSuggestions] = useState([]);
+
+  // Suggest existing client names (of the selected company, if any) as the name is typed
+  useEffect(() => {
+    const prefix = entry.client_name.trim();
+    if (!prefix) {
+      setClientSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const params = { prefix };
+        if (entry.company_id) params.company_id = entry.company_id;
+        const response = await axios.get(`${API}/client-names`, { params });
+        if (!cancelled) setClientSuggestions(response.data);
+      } catch (error) {
+        console.error('Failed to fetch client names:', error);
+      }
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [entry.client_name, entry.company_id]);
 
   const handleSubmit = async (e) => {
     e.preventDefault();
@@ -1446,11 +1526,18 @@ function CreateEntryDialog({ companies, onSuccess }) {
             <Label htmlFor="client_name">Nom du client</Label>
             <Input
               id="client_name"
+              list="client-name-suggestions"
+              autoComplete="off"
               value={entry.client_name}
               onChange={(e) => setEntry(prev => ({ ...prev, client_name: e.target.value }))}
               className="mt-2"
               required
             />
+            <datalist id="client-name-suggestions">
+              {clientSuggestions.map((name) => (
+                <option key={name} value={name} />
+              ))}
+            </datalist>
           </div>
           <div>
             <Label htmlFor="invoice_number">Numéro de facture</Label>
@@ -1598,8 +1685,17 @@ function RelanceDialog({ entryId, onSubmit, trigger }) {
   const fetchRelances = async () => {
     setLoadingRelances(true);
     try {
-      const response = await axios.get(`${API}/reminders/${entryId}`);
-      setRelances(response.data);
+      // The history is paginated, newest first: follow the cursor to get all of it
+      let loaded = [];
+      let cursor;
+      do {
+        const response = await axios.get(`${API}/reminders/${entryId}`, {
+          params: { limit: PAGE_SIZE, cursor }
+        });
+        loaded = loaded.concat(response.data);
+        setRelances(loaded);
+        cursor = response.headers['x-next-cursor'];
+      } while (cursor);
     } catch (error) {
       console.error('Failed to fetch relances:', error);
     } finally {
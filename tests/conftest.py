@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads its configuration at import time; the client does not connect until first used
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "paytrack_test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+
+from server import PAYMENT_ENTRY_SCHEMA, write_columnar_export
+
+def entry(**overrides):
+    document = {
+        "id": "e1",
+        "company_id": "c1",
+        "company_name": "Entreprise",
+        "client_name": "Client",
+        "invoice_number": "F-001",
+        "amount": 1234.5,
+        "created_by": "u1",
+        "created_by_name": "Employé",
+        "created_at": datetime(2024, 3, 1, 12, 30),
+        "is_validated": False,
+        "validated_at": None,
+        "validated_by": None,
+        "validated_by_name": None,
+        "reminder_count": 0,
+        "last_reminder_at": None,
+    }
+    document.update(overrides)
+    return document
+
+async def batches_of(*batches):
+    for batch in batches:
+        yield batch
+
+def export(tmp_path, format, *batches):
+    path = str(tmp_path / f"export.{format}")
+    asyncio.run(write_columnar_export(batches_of(*batches), PAYMENT_ENTRY_SCHEMA, path, format))
+    if format == "parquet":
+        return pyarrow.parquet.read_table(path)
+    with pyarrow.ipc.open_file(path) as reader:
+        return reader.read_all()
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_typed_columns_across_batches(tmp_path, format):
+    table = export(
+        tmp_path, format,
+        [entry(id="e1"), entry(id="e2", is_validated=True, validated_at=datetime(2024, 3, 2), validated_by="u2")],
+        [entry(id="e3", reminder_count=2, last_reminder_at=datetime(2024, 3, 5))],
+    )
+    assert table.schema.equals(PAYMENT_ENTRY_SCHEMA)
+    assert table.column("id").to_pylist() == ["e1", "e2", "e3"]
+    assert table.column("amount").to_pylist() == [1234.5] * 3
+    assert table.column("is_validated").to_pylist() == [False, True, False]
+    assert table.column("created_at")[0].as_py() == datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_legacy_string_dates(tmp_path, format):
+    table = export(tmp_path, format, [
+        entry(id="iso", created_at="2023-11-05T08:00:00"),
+        entry(id="zulu", created_at="2023-11-05T08:00:00Z"),
+        entry(id="garbage", created_at="pas une date"),
+        entry(id="missing", created_at=None),
+    ])
+    assert table.column("created_at").to_pylist() == [
+        datetime(2023, 11, 5, 8, tzinfo=timezone.utc),
+        datetime(2023, 11, 5, 8, tzinfo=timezone.utc),
+        None,
+        None,
+    ]
+
+def test_empty_export_keeps_the_schema(tmp_path):
+    table = export(tmp_path, "parquet")
+    assert table.num_rows == 0
+    assert table.schema.equals(PAYMENT_ENTRY_SCHEMA)
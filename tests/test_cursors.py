@@ -0,0 +1,136 @@
+import base64
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from server import decode_cursor, encode_cursor, keyset_after
+
+BASE = datetime(2024, 5, 1, 9, 0, 0, 123000)
+
+@pytest.mark.parametrize("value", [BASE, 1234.5, 0, -7, None, "2023-11-05T08:00:00"])
+def test_cursor_round_trip(value):
+    cursor = encode_cursor(value, "doc-1", "-created_at")
+    assert decode_cursor(cursor, "-created_at") == {"value": value, "id": "doc-1"}
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(BASE, "?&/+=", "amount")
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_=")
+
+def test_cursor_from_another_sort_is_rejected():
+    cursor = encode_cursor(1234.5, "doc-1", "amount")
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "-amount")
+    assert error.value.status_code == 400
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !",
+    base64.urlsafe_b64encode(b"not json").decode(),
+    base64.urlsafe_b64encode(b"[1, 2]").decode(),
+    base64.urlsafe_b64encode(b'{"s": "-created_at", "id": "x"}').decode(),
+    base64.urlsafe_b64encode(b'{"s": "-created_at", "v": {"d": "yesterday"}, "id": "x"}').decode(),
+])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, "-created_at")
+    assert error.value.status_code == 400
+
+def bracket(value):
+    """Mongo type bracket order of the value types a sort field can hold"""
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 2
+    return 1
+
+BRACKET_TYPES = {"number": 1, "string": 2, "date": 3}
+
+def matches(document, condition):
+    """Evaluate the subset of the Mongo query language keyset_after produces, type brackets included"""
+    for key, expected in condition.items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in expected):
+                return False
+            continue
+        value = document.get(key)
+        if not isinstance(expected, dict):
+            # Equality with None also matches a missing field
+            if value != expected:
+                return False
+            continue
+        for operator, operand in expected.items():
+            if operator == "$ne":
+                ok = value != operand
+            elif operator == "$type":
+                ok = value is not None and bracket(value) == BRACKET_TYPES[operand]
+            elif value is None or operand is None or bracket(value) != bracket(operand):
+                # Range operators never match across type brackets
+                ok = False
+            elif operator == "$lt":
+                ok = value < operand
+            elif operator == "$gt":
+                ok = value > operand
+            else:
+                raise AssertionError(operator)
+            if not ok:
+                return False
+    return True
+
+def mongo_order(documents, field, descending):
+    # By type bracket first (null/missing < numbers < strings < dates); id breaks ties in the same direction
+    def key(document):
+        value = document.get(field)
+        return (bracket(value), value if value is not None else 0, document["id"])
+    ordered = sorted(documents, key=key)
+    return ordered[::-1] if descending else ordered
+
+def documents_with(values):
+    documents = []
+    for index, value in enumerate(values):
+        document = {"id": f"id-{index:02d}"}
+        if value is not None or index % 2:
+            # Half of the null values are stored as null, the other half are missing
+            document["value"] = value
+        documents.append(document)
+    return documents
+
+VALUE_SETS = {
+    "dates with ties and nulls": [BASE, BASE, None, BASE + timedelta(seconds=1), None, BASE - timedelta(days=3), BASE],
+    "numbers with ties and nulls": [10.0, None, 10.0, -5, 0, None, 250.75, 10.0],
+    "no nulls": [3, 1, 2, 2, 5],
+    "only nulls": [None, None, None],
+    # Legacy entries hold created_at as an ISO string; they must not be skipped after the last date
+    "legacy string dates": [BASE, "2023-11-05T08:00:00", None, BASE, "2023-01-01", BASE - timedelta(days=1), "2023-11-05T08:00:00"],
+    "every type bracket": [BASE, 12.5, "2024-01-01", None, 3, BASE, "abc", None, 12.5],
+}
+
+@pytest.mark.parametrize("descending", [True, False], ids=["desc", "asc"])
+@pytest.mark.parametrize("values", VALUE_SETS.values(), ids=VALUE_SETS.keys())
+def test_keyset_after_returns_exactly_the_following_documents(values, descending):
+    documents = documents_with(values)
+    ordered = mongo_order(documents, "value", descending)
+    for position, document in enumerate(ordered):
+        cursor = {"value": document.get("value"), "id": document["id"]}
+        condition = keyset_after(cursor, "value", descending)
+        following = [d for d in mongo_order([d for d in documents if matches(d, condition)], "value", descending)]
+        assert following == ordered[position + 1:]
+
+@pytest.mark.parametrize("descending", [True, False], ids=["desc", "asc"])
+def test_pages_through_an_encoded_cursor(descending):
+    values = [BASE + timedelta(minutes=minutes) for minutes in (5, 1, 1, 3, 0)] + [None, None]
+    documents = documents_with(values)
+    sort = "-value" if descending else "value"
+    seen, cursor = [], None
+    for _ in itertools.count():
+        page_source = documents if cursor is None else [
+            d for d in documents if matches(d, keyset_after(decode_cursor(cursor, sort), "value", descending))
+        ]
+        page = mongo_order(page_source, "value", descending)[:2]
+        if not page:
+            break
+        seen.extend(page)
+        cursor = encode_cursor(page[-1].get("value"), page[-1]["id"], sort)
+    assert seen == mongo_order(documents, "value", descending)
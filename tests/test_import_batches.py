@@ -0,0 +1,44 @@
+import io
+import json
+
+from server import IMPORT_BATCH_SIZE, iter_csv_rows, iter_json_array, parse_import_batch
+
+def json_rows(items):
+    return iter_json_array(io.BytesIO(json.dumps(items).encode()))
+
+def row(**overrides):
+    values = {"company_id": "c1", "client_name": "Client", "invoice_number": "F-001", "amount": 10}
+    values.update(overrides)
+    return values
+
+def test_valid_and_invalid_rows_are_sorted_out():
+    rows = json_rows([row(), "not an object", row(amount="abc"), row(company_id="unknown"), row(client_name="Élise")])
+    read, documents, errors, finished = parse_import_batch(rows, 1, {"c1"}, "u1")
+    assert (read, finished) == (5, True)
+    assert [number for number, _ in documents] == [1, 5]
+    assert [number for number, _ in errors] == [2, 3, 4]
+    document = documents[1][1]
+    assert document["created_by"] == "u1"
+    assert document["search_keys"] == ["elise", "f-001"]
+
+def test_batches_continue_row_numbering():
+    rows = json_rows([row(invoice_number=f"F-{i}") for i in range(IMPORT_BATCH_SIZE + 3)])
+    read, documents, errors, finished = parse_import_batch(rows, 1, {"c1"}, "u1")
+    assert (read, len(documents), finished) == (IMPORT_BATCH_SIZE, IMPORT_BATCH_SIZE, False)
+    read, documents, errors, finished = parse_import_batch(rows, 1 + read, {"c1"}, "u1")
+    assert (read, finished) == (3, True)
+    assert [number for number, _ in documents] == [IMPORT_BATCH_SIZE + 1, IMPORT_BATCH_SIZE + 2, IMPORT_BATCH_SIZE + 3]
+
+def test_malformed_file_stops_with_an_error_row():
+    rows = iter_json_array(io.BytesIO(b'[{"company_id": "c1", "client_name": "A", "invoice_number": "1", "amount": 1} {"x": 1}]'))
+    read, documents, errors, finished = parse_import_batch(rows, 1, {"c1"}, "u1")
+    assert finished
+    assert len(documents) == 1
+    assert errors[0][0] == 2 and errors[0][1].startswith("Fichier illisible")
+
+def test_csv_rows():
+    stream = io.BytesIO("company_id;client_name;invoice_number;amount\nc1;Client;F-1;12.5\nc2;Client;F-2;7\n".encode())
+    read, documents, errors, finished = parse_import_batch(iter_csv_rows(stream), 1, {"c1"}, "u1")
+    assert read == 2 and finished
+    assert [document["amount"] for _, document in documents] == [12.5]
+    assert errors == [(2, "Entreprise inconnue")]
@@ -0,0 +1,73 @@
+import pytest
+
+from server import REQUIRED_INDEXES
+
+# Query shapes issued by the endpoints, as (collection, equality fields, sort/range keys).
+# Small collections read whole (companies, users by role, rollups, versions) are not listed.
+QUERY_SHAPES = [
+    ("users", {"id"}, []),
+    ("users", {"user_id"}, []),
+    ("companies", {"id"}, []),
+    # Single entry writes, bulk validation by ids, reminder batch lookup
+    ("payment_entries", {"id"}, []),
+    # GET /payment-entries and exports: default order, either direction
+    ("payment_entries", set(), [("created_at", -1), ("id", -1)]),
+    ("payment_entries", set(), [("created_at", 1), ("id", 1)]),
+    # Pending tab, optionally one company's or one employee's; bulk validation by date range
+    ("payment_entries", {"is_validated"}, [("created_at", -1), ("id", -1)]),
+    ("payment_entries", {"company_id", "is_validated"}, [("created_at", -1), ("id", -1)]),
+    ("payment_entries", {"created_by", "is_validated"}, [("created_at", -1), ("id", -1)]),
+    # Validated tab (sort=-validated_at), optionally one company's
+    ("payment_entries", {"is_validated"}, [("validated_at", -1), ("id", -1)]),
+    ("payment_entries", {"company_id", "is_validated"}, [("validated_at", -1), ("id", -1)]),
+    # Pending entries by least (or most) recently chased
+    ("payment_entries", {"is_validated"}, [("last_reminder_at", 1), ("id", 1)]),
+    ("payment_entries", {"is_validated"}, [("last_reminder_at", -1), ("id", -1)]),
+    # sort=amount / sort=-amount, and amount ranges
+    ("payment_entries", set(), [("amount", 1), ("id", 1)]),
+    ("payment_entries", set(), [("amount", -1), ("id", -1)]),
+    # Search, search backfill ($exists: false uses the null bounds), bulk validation read-back
+    ("payment_entries", {"search_grams"}, []),
+    ("payment_entries", {"search_keys"}, []),
+    ("payment_entries", {"validation_batch"}, []),
+    # History of one entry (GET /reminders/{id}, POST /reminders/batch) and the reminders export
+    ("reminders", {"payment_entry_id"}, [("triggered_at", -1), ("id", -1)]),
+    ("reminders", set(), [("payment_entry_id", 1), ("triggered_at", -1), ("id", -1)]),
+]
+
+def index_keys(index):
+    return [(field, direction) for field, direction in index.document["key"].items()]
+
+def serves(keys, equality, sort):
+    """Equality fields first (any order), then the sort keys in order, all in the same or all in the opposite direction"""
+    if len(keys) < len(equality) + len(sort):
+        return False
+    if {field for field, _ in keys[:len(equality)]} != equality:
+        return False
+    following = keys[len(equality):len(equality) + len(sort)]
+    reversed_sort = [(field, -direction) for field, direction in sort]
+    return following == sort or following == reversed_sort
+
+def shape_id(shape):
+    collection, equality, sort = shape
+    return f"{collection}:{'+'.join(sorted(equality)) or '-'}:{','.join(f'{f}{d:+d}' for f, d in sort)}"
+
+@pytest.mark.parametrize("shape", QUERY_SHAPES, ids=shape_id)
+def test_query_shape_has_prefix_index(shape):
+    collection, equality, sort = shape
+    indexes = REQUIRED_INDEXES.get(collection, [])
+    assert any(serves(index_keys(index), equality, sort) for index in indexes), (
+        f"No declared index on {collection} starts with {sorted(equality)} then {sort}"
+    )
+
+def test_index_names_are_unique_per_collection():
+    for collection, indexes in REQUIRED_INDEXES.items():
+        names = [index.document["name"] for index in indexes]
+        assert len(names) == len(set(names)), collection
+
+def test_every_index_is_used_by_a_query_shape():
+    for collection, indexes in REQUIRED_INDEXES.items():
+        shapes = [(equality, sort) for shape_collection, equality, sort in QUERY_SHAPES if shape_collection == collection]
+        for index in indexes:
+            keys = index_keys(index)
+            assert any(serves(keys, equality, sort) for equality, sort in shapes), index.document["name"]
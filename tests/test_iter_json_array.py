@@ -0,0 +1,126 @@
+import io
+import json
+
+import pytest
+
+from server import iter_json_array
+
+ITEMS = [
+    {"company_id": "c1", "client_name": "Élise SA", "invoice_number": "F-001", "amount": 1234.5},
+    {"company_id": "c2", "client_name": "Acme [\"quoted\"], {braces}", "invoice_number": "F-002", "amount": 12},
+    [1, 2, {"nested": [3, 4]}],
+    123456789,
+    -0.5e10,
+    "text with , and ]",
+    True,
+    None,
+]
+
+def parse(text, chunk_size, encoding="utf-8"):
+    return list(iter_json_array(io.BytesIO(text.encode(encoding)), chunk_size=chunk_size))
+
+@pytest.mark.parametrize("chunk_size", range(1, 40))
+def test_items_parse_across_every_chunk_boundary(chunk_size):
+    text = json.dumps(ITEMS, ensure_ascii=False)
+    assert parse(text, chunk_size) == ITEMS
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 65536])
+def test_whitespace_between_tokens(chunk_size):
+    text = ' \n[\n  {"a": 1} ,\n\t2\n ,  "x"  ]\n\n'
+    assert parse(text, chunk_size) == [{"a": 1}, 2, "x"]
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 65536])
+def test_number_split_at_buffer_end(chunk_size):
+    assert parse("[12345,678]", chunk_size) == [12345, 678]
+
+def test_byte_order_mark_is_skipped():
+    assert parse('[{"a": 1}]', 3, encoding="utf-8-sig") == [{"a": 1}]
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "[\n]\n"])
+def test_empty_array(text):
+    assert parse(text, 1) == []
+
+@pytest.mark.parametrize("text", ["", "   \n"])
+def test_empty_file(text):
+    with pytest.raises(ValueError, match="vide"):
+        parse(text, 4)
+
+@pytest.mark.parametrize("text", ['{"a": 1}', "1", '"x"'])
+def test_not_an_array(text):
+    with pytest.raises(ValueError, match="tableau JSON est attendu"):
+        parse(text, 4)
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 65536])
+@pytest.mark.parametrize("text", ["[", '[{"a": 1}', '[{"a": 1},', '[{"a": 1}, {"b"', '[{"a": "unterminated'])
+def test_truncated_input(text, chunk_size):
+    with pytest.raises(ValueError):
+        parse(text, chunk_size)
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+@pytest.mark.parametrize("text", [
+    '[{"a": 1} {"b": 2}]',
+    "[1 2]",
+    "[1,,2]",
+    "[,1]",
+    "[1,]",
+    "[1,2,]",
+    '[{"a": }]',
+    "[nul]",
+])
+def test_malformed_array(text, chunk_size):
+    with pytest.raises(ValueError):
+        parse(text, chunk_size)
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 65536])
+@pytest.mark.parametrize("text", ["[1]x", "[1] [2]", "[1]]", '[{"a": 1}],'])
+def test_content_after_array(text, chunk_size):
+    with pytest.raises(ValueError):
+        parse(text, chunk_size)
+
+def test_items_before_an_error_are_yielded():
+    # The importer keeps the rows read before the file turned out malformed
+    items = iter_json_array(io.BytesIO(b'[{"a": 1}, {"b": 2} {"c": 3}]'), chunk_size=4)
+    assert next(items) == {"a": 1}
+    assert next(items) == {"b": 2}
+    with pytest.raises(ValueError, match="Virgule attendue"):
+        next(items)
+
+@pytest.mark.parametrize("chunk_size", [7, 512])
+def test_unterminated_item_is_rejected_past_the_size_cap(chunk_size):
+    text = '[1, "' + "x" * 5000
+    with pytest.raises(ValueError, match="trop volumineux"):
+        list(iter_json_array(io.BytesIO(text.encode()), chunk_size=chunk_size, max_item_size=1000))
+
+def test_oversized_number_is_rejected():
+    text = "[" + "1" * 5000 + "]"
+    with pytest.raises(ValueError, match="trop volumineux"):
+        list(iter_json_array(io.BytesIO(text.encode()), chunk_size=64, max_item_size=1000))
+
+def test_items_up_to_the_size_cap_parse():
+    item = {"client_name": "x" * 900}
+    text = json.dumps([item, item])
+    assert list(iter_json_array(io.BytesIO(text.encode()), chunk_size=16, max_item_size=1000)) == [item, item]
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+    
+    def read(self, size=-1):
+        data = super().read(size)
+        self.consumed += len(data)
+        return data
+    
+    def read1(self, size=-1):
+        data = super().read1(size)
+        self.consumed += len(data)
+        return data
+
+def test_large_unterminated_upload_fails_fast():
+    # With the default cap the parser stops after about a megabyte instead of rescanning the whole upload
+    stream = CountingStream(b'[1, "' + b"x" * (16 * 1024 * 1024))
+    items = iter_json_array(stream)
+    assert next(items) == 1
+    with pytest.raises(ValueError, match="trop volumineux"):
+        next(items)
+    assert stream.consumed < 4 * 1024 * 1024
@@ -0,0 +1,175 @@
+import asyncio
+import re
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from server import ROLLUP_FIELDS, ROLLUP_PIPELINE, add_rollup_delta, compute_rollups, month_key, rollup_id
+
+# ISO 8601 forms MongoDB's $convert (to: "date") accepts from a string
+MONGO_DATE_STRING = re.compile(r"\d{4}-\d{2}-\d{2}(T\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?(Z|[+-]\d{2}:\d{2})?")
+
+def evaluate(expression, document):
+    """Evaluate the subset of the aggregation expression language the rollup pipeline uses"""
+    if isinstance(expression, str) and expression.startswith("$"):
+        return document.get(expression[1:])
+    if not isinstance(expression, dict):
+        return expression
+    (operator, argument), = expression.items()
+    if operator == "$cond":
+        condition, if_true, if_false = argument
+        return evaluate(if_true if evaluate(condition, document) else if_false, document)
+    if operator == "$convert":
+        assert argument["to"] == "date"
+        value = evaluate(argument["input"], document)
+        if value is None:
+            return argument["onNull"]
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, str) and MONGO_DATE_STRING.fullmatch(value):
+            # BSON dates are UTC instants
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return parsed.astimezone(timezone.utc).replace(tzinfo=None) if parsed.tzinfo else parsed
+        return argument["onError"]
+    if operator == "$dateToString":
+        assert argument["format"] == "%Y-%m"
+        value = evaluate(argument["date"], document)
+        return argument["onNull"] if value is None else value.strftime("%Y-%m")
+    raise AssertionError(operator)
+
+def run_pipeline(entries):
+    (stage,) = ROLLUP_PIPELINE
+    result = {}
+    for dimension, (group_stage,) in stage["$facet"].items():
+        group = dict(group_stage["$group"])
+        key_expression = group.pop("_id")
+        groups = {}
+        for entry in entries:
+            key = evaluate(key_expression, entry)
+            totals = groups.setdefault(key, {"_id": key, **dict.fromkeys(group, 0)})
+            for field, accumulator in group.items():
+                totals[field] += evaluate(accumulator["$sum"], entry)
+        result[dimension] = list(groups.values())
+    return result
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+    
+    async def to_list(self, length):
+        return self.documents
+
+class FakeDatabase:
+    def __init__(self, entries):
+        self.payment_entries = self
+        self.entries = entries
+    
+    def aggregate(self, pipeline):
+        assert pipeline is ROLLUP_PIPELINE
+        return FakeCursor([run_pipeline(self.entries)])
+
+def rebuild(monkeypatch, entries):
+    """compute_rollups() output, keyed by rollup id, without empty groups"""
+    monkeypatch.setattr(server, "db", FakeDatabase(entries))
+    documents = asyncio.run(compute_rollups())
+    return {document["_id"]: {field: document[field] for field in ROLLUP_FIELDS} for document in documents}
+
+def apply(rollups, deltas):
+    """What apply_rollup_deltas' upserting $inc does to the collection"""
+    for (dimension, key), delta in deltas.items():
+        counters = rollups.setdefault(rollup_id(dimension, key), dict.fromkeys(ROLLUP_FIELDS, 0))
+        for field, value in delta.items():
+            counters[field] += value
+
+def non_empty(rollups):
+    # get_analytics hides groups whose count dropped to zero
+    return {key: counters for key, counters in rollups.items() if counters["count"] != 0}
+
+def entry(entry_id, company_id, created_by, created_at, amount, is_validated=False):
+    return {
+        "id": entry_id, "company_id": company_id, "created_by": created_by,
+        "created_at": created_at, "amount": amount, "is_validated": is_validated
+    }
+
+@pytest.fixture
+def ledger():
+    return [
+        entry("e1", "c1", "u1", datetime(2024, 3, 1, 10), 100.5),
+        entry("e2", "c1", "u2", datetime(2024, 3, 31, 23, 59), 20.25, is_validated=True),
+        entry("e3", "c2", "u1", "2023-11-05T08:00:00", 7.75),
+        entry("e4", "c2", "u2", "2023-11-05T08:00:00Z", 12.0, is_validated=True),
+        entry("e5", "c3", "u1", "2023-01-15", 1.5),
+        entry("e6", "c3", "u3", "pas une date", 3.0),
+        entry("e7", "c1", "u3", None, 4.5),
+    ]
+
+@pytest.mark.parametrize("created_at", [
+    datetime(2024, 2, 29, 12), "2023-11-05T08:00:00", "2023-11-05T08:00:00Z", "2023-11-05T08:00:00.123+02:00",
+    "2023-11-01T01:00:00+02:00", "2023-01-15", "pas une date", "", None,
+])
+def test_month_key_matches_the_pipeline_expression(created_at):
+    document = {"created_at": created_at}
+    assert month_key(created_at) == evaluate(server.MONTH_KEY_EXPR, document)
+
+def test_create(monkeypatch, ledger):
+    rollups = rebuild(monkeypatch, ledger)
+    created = [entry("n1", "c4", "u4", datetime(2024, 4, 2), 9.5), entry("n2", "c1", "u1", "2023-11-20T10:00:00", 2.5)]
+    for new_entry in created:
+        apply(rollups, add_rollup_delta({}, new_entry, count=1))
+    assert non_empty(rollups) == rebuild(monkeypatch, ledger + created)
+
+@pytest.mark.parametrize("changes", [
+    {"company_id": "c9"},
+    {"amount": 55.25},
+    {"company_id": "c2", "amount": 0.5},
+    {"created_by": "u9"},
+    {"created_at": datetime(2022, 6, 1)},
+    {"created_at": "2021-12-31T23:00:00"},
+    {},
+], ids=["company", "amount", "company+amount", "employee", "month", "month from string", "unchanged"])
+@pytest.mark.parametrize("entry_id", ["e1", "e3", "e6"])
+def test_update_moves_the_entry_between_groups(monkeypatch, ledger, entry_id, changes):
+    rollups = rebuild(monkeypatch, ledger)
+    before = next(e for e in ledger if e["id"] == entry_id)
+    after = {**before, **changes}
+    # Same deltas as update_payment_entry
+    deltas = add_rollup_delta({}, before, count=-1)
+    add_rollup_delta(deltas, after, count=1)
+    apply(rollups, deltas)
+    assert non_empty(rollups) == rebuild(monkeypatch, [after if e["id"] == entry_id else e for e in ledger])
+
+@pytest.mark.parametrize("entry_id", ["e1", "e3", "e5", "e6", "e7"])
+def test_delete(monkeypatch, ledger, entry_id):
+    rollups = rebuild(monkeypatch, ledger)
+    deleted = next(e for e in ledger if e["id"] == entry_id)
+    apply(rollups, add_rollup_delta({}, deleted, count=-1))
+    assert non_empty(rollups) == rebuild(monkeypatch, [e for e in ledger if e["id"] != entry_id])
+
+def test_validate(monkeypatch, ledger):
+    rollups = rebuild(monkeypatch, ledger)
+    pending = [e for e in ledger if not e["is_validated"]]
+    deltas = {}
+    for validated in pending:
+        add_rollup_delta(deltas, validated, validated=1)
+    apply(rollups, deltas)
+    assert non_empty(rollups) == rebuild(monkeypatch, [{**e, "is_validated": True} for e in ledger])
+
+def test_sequence_of_writes(monkeypatch, ledger):
+    rollups = rebuild(monkeypatch, ledger)
+    entries = {e["id"]: dict(e) for e in ledger}
+    
+    created = entry("n1", "c2", "u1", "2023-11-30T12:00:00", 8.0)
+    entries["n1"] = created
+    apply(rollups, add_rollup_delta({}, created, count=1))
+    
+    before, entries["n1"] = created, {**created, "company_id": "c1", "amount": 16.0}
+    deltas = add_rollup_delta({}, before, count=-1)
+    apply(rollups, add_rollup_delta(deltas, entries["n1"], count=1))
+    
+    apply(rollups, add_rollup_delta({}, entries["n1"], validated=1))
+    entries["n1"]["is_validated"] = True
+    
+    apply(rollups, add_rollup_delta({}, entries.pop("e3"), count=-1))
+    
+    assert non_empty(rollups) == rebuild(monkeypatch, list(entries.values()))